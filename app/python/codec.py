@@ -0,0 +1,328 @@
+import json
+import struct
+
+
+# Wire codecs.
+#
+# JSON (text frames) is always understood and is used until the gateway
+# selects a different codec in response to the "codec_offer" sent after
+# connecting. The binary codec is a MessagePack subset (binary frames) with
+# an extension for string interning: map keys and entity ids (eid values and
+# the first item of each state_update_batch "updates" pair) are sent in full
+# once per connection and as small integers afterwards.
+#
+# Frames are decoded based on their type (text: JSON, binary: msgpack), so
+# no care is needed when the codec is switched while messages are in flight.
+
+
+class JsonCodec:
+
+    name = 'json'
+
+    def encode(self, msg):
+        return json.dumps({ 'data': msg })
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+# interning extension types
+_EXT_DEFINE = 1     # payload: index (uint16 big-endian) + utf-8 string
+_EXT_REF = 2        # payload: index (uint8 or uint16 big-endian)
+
+# strings interned, in addition to map keys: values of these keys
+_INTERN_KEYS = { 'eid' }
+# and the first item of each [ eid, value ] pair in the values of these
+_INTERN_PAIRS = { 'updates' }
+_INTERN_MAX = 0xffff
+
+
+class PackCodec:
+    """MessagePack subset with string interning.
+
+    Encoder and decoder keep separate intern tables, one instance per
+    connection (the gateway keeps the matching tables on its side).
+    """
+
+    name = 'msgpack'
+
+    def __init__(self):
+        self._out = {}      # str -> index
+        self._in = []       # index -> str
+
+    # encoder
+
+    def encode(self, msg):
+        buf = bytearray()
+        self._pack({ 'data': msg }, buf)
+        return bytes(buf)
+
+    def _pack(self, obj, buf, intern=False):
+        if obj is None:
+            buf.append(0xc0)
+        elif obj is True:
+            buf.append(0xc3)
+        elif obj is False:
+            buf.append(0xc2)
+        elif isinstance(obj, int):
+            self._pack_int(obj, buf)
+        elif isinstance(obj, float):
+            buf.append(0xcb)
+            buf += struct.pack('>d', obj)
+        elif isinstance(obj, str):
+            if intern:
+                self._pack_interned(obj, buf)
+            else:
+                self._pack_str(obj, buf)
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            self._pack_bin(obj, buf)
+        elif isinstance(obj, (list, tuple)):
+            self._pack_array_header(len(obj), buf)
+            for item in obj:
+                self._pack(item, buf)
+        elif isinstance(obj, dict):
+            n = len(obj)
+            if n < 16:
+                buf.append(0x80 | n)
+            elif n <= 0xffff:
+                buf.append(0xde)
+                buf += struct.pack('>H', n)
+            else:
+                buf.append(0xdf)
+                buf += struct.pack('>I', n)
+            for k, v in obj.items():
+                self._pack(k, buf, True)
+                if k in _INTERN_PAIRS and isinstance(v, (list, tuple)):
+                    self._pack_pairs(v, buf)
+                else:
+                    self._pack(v, buf, k in _INTERN_KEYS)
+        else:
+            raise TypeError(f"msgpack: cannot encode {type(obj)}")
+
+    def _pack_array_header(self, n, buf):
+        if n < 16:
+            buf.append(0x90 | n)
+        elif n <= 0xffff:
+            buf.append(0xdc)
+            buf += struct.pack('>H', n)
+        else:
+            buf.append(0xdd)
+            buf += struct.pack('>I', n)
+
+    def _pack_pairs(self, pairs, buf):
+        # [ [ eid, value ], ... ], eids interned
+        self._pack_array_header(len(pairs), buf)
+        for pair in pairs:
+            if not isinstance(pair, (list, tuple)) or not pair:
+                self._pack(pair, buf)
+                continue
+            self._pack_array_header(len(pair), buf)
+            self._pack(pair[0], buf, True)
+            for item in pair[1:]:
+                self._pack(item, buf)
+
+    def _pack_int(self, i, buf):
+        if 0 <= i < 0x80:
+            buf.append(i)
+        elif -32 <= i < 0:
+            buf.append(i & 0xff)
+        elif 0 <= i <= 0xff:
+            buf.append(0xcc)
+            buf.append(i)
+        elif 0 <= i <= 0xffff:
+            buf.append(0xcd)
+            buf += struct.pack('>H', i)
+        elif 0 <= i <= 0xffffffff:
+            buf.append(0xce)
+            buf += struct.pack('>I', i)
+        elif 0 <= i:
+            buf.append(0xcf)
+            buf += struct.pack('>Q', i)
+        elif -0x80 <= i:
+            buf.append(0xd0)
+            buf += struct.pack('>b', i)
+        elif -0x8000 <= i:
+            buf.append(0xd1)
+            buf += struct.pack('>h', i)
+        elif -0x80000000 <= i:
+            buf.append(0xd2)
+            buf += struct.pack('>i', i)
+        else:
+            buf.append(0xd3)
+            buf += struct.pack('>q', i)
+
+    def _pack_str(self, s, buf):
+        b = s.encode()
+        n = len(b)
+        if n < 32:
+            buf.append(0xa0 | n)
+        elif n <= 0xff:
+            buf.append(0xd9)
+            buf.append(n)
+        elif n <= 0xffff:
+            buf.append(0xda)
+            buf += struct.pack('>H', n)
+        else:
+            buf.append(0xdb)
+            buf += struct.pack('>I', n)
+        buf += b
+
+    def _pack_bin(self, b, buf):
+        n = len(b)
+        if n <= 0xff:
+            buf.append(0xc4)
+            buf.append(n)
+        elif n <= 0xffff:
+            buf.append(0xc5)
+            buf += struct.pack('>H', n)
+        else:
+            buf.append(0xc6)
+            buf += struct.pack('>I', n)
+        buf += b
+
+    def _pack_interned(self, s, buf):
+        index = self._out.get(s)
+        if index is not None:
+            if index <= 0xff:
+                buf += struct.pack('>BbB', 0xd4, _EXT_REF, index)
+            else:
+                buf += struct.pack('>BbH', 0xd5, _EXT_REF, index)
+            return
+        index = len(self._out)
+        if index > _INTERN_MAX:
+            # table full, send as is
+            self._pack_str(s, buf)
+            return
+        self._out[s] = index
+        b = s.encode()
+        n = len(b) + 2
+        if n <= 0xff:
+            buf += struct.pack('>BBbH', 0xc7, n, _EXT_DEFINE, index)
+        else:
+            buf += struct.pack('>BHbH', 0xc8, n, _EXT_DEFINE, index)
+        buf += b
+
+    # decoder
+
+    def decode(self, data):
+        obj, _ = self._unpack(memoryview(data), 0)
+        return obj
+
+    def _unpack(self, b, i):
+        t = b[i]
+        i += 1
+        if t < 0x80:
+            return t, i
+        if t >= 0xe0:
+            return t - 0x100, i
+        if 0xa0 <= t <= 0xbf:
+            n = t & 0x1f
+            return str(b[i:i+n], 'utf-8'), i + n
+        if t == 0xd4 and b[i] == _EXT_REF:
+            # interned string, the common case in state updates
+            return self._in[b[i+1]], i + 2
+        if 0x90 <= t <= 0x9f:
+            return self._unpack_array(b, i, t & 0x0f)
+        if 0x80 <= t <= 0x8f:
+            return self._unpack_map(b, i, t & 0x0f)
+        if t == 0xc0:
+            return None, i
+        if t == 0xc2:
+            return False, i
+        if t == 0xc3:
+            return True, i
+        if t == 0xca:
+            return struct.unpack_from('>f', b, i)[0], i + 4
+        if t == 0xcb:
+            return struct.unpack_from('>d', b, i)[0], i + 8
+        fmt = _INT_FORMATS.get(t)
+        if fmt:
+            return struct.unpack_from(fmt, b, i)[0], i + struct.calcsize(fmt)
+        if t in (0xd9, 0xda, 0xdb, 0xc4, 0xc5, 0xc6):
+            fmt = _LEN_FORMATS[t]
+            n = struct.unpack_from(fmt, b, i)[0]
+            i += struct.calcsize(fmt)
+            if t >= 0xd9:
+                return str(b[i:i+n], 'utf-8'), i + n
+            return bytes(b[i:i+n]), i + n
+        if t in (0xdc, 0xdd):
+            fmt = _LEN_FORMATS[t]
+            n = struct.unpack_from(fmt, b, i)[0]
+            return self._unpack_array(b, i + struct.calcsize(fmt), n)
+        if t in (0xde, 0xdf):
+            fmt = _LEN_FORMATS[t]
+            n = struct.unpack_from(fmt, b, i)[0]
+            return self._unpack_map(b, i + struct.calcsize(fmt), n)
+        if t in _FIXEXT_SIZES:
+            return self._unpack_ext(b, i + 1, b[i], _FIXEXT_SIZES[t])
+        if t in (0xc7, 0xc8, 0xc9):
+            fmt = _LEN_FORMATS[t]
+            n = struct.unpack_from(fmt, b, i)[0]
+            i += struct.calcsize(fmt)
+            return self._unpack_ext(b, i + 1, b[i], n)
+        raise ValueError(f"msgpack: unsupported type 0x{t:02x}")
+
+    def _unpack_array(self, b, i, n):
+        result = []
+        for _ in range(n):
+            obj, i = self._unpack(b, i)
+            result.append(obj)
+        return result, i
+
+    def _unpack_map(self, b, i, n):
+        result = {}
+        for _ in range(n):
+            k, i = self._unpack(b, i)
+            v, i = self._unpack(b, i)
+            result[k] = v
+        return result, i
+
+    def _unpack_ext(self, b, i, ext_type, n):
+        if ext_type == _EXT_REF:
+            index = b[i] if n == 1 else struct.unpack_from('>H', b, i)[0]
+            return self._in[index], i + n
+        if ext_type == _EXT_DEFINE:
+            index = struct.unpack_from('>H', b, i)[0]
+            s = str(b[i+2:i+n], 'utf-8')
+            if index == len(self._in):
+                self._in.append(s)
+            else:
+                self._in[index] = s
+            return s, i + n
+        raise ValueError(f"msgpack: unknown extension type {ext_type}")
+
+
+_INT_FORMATS = {
+    0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+    0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q',
+}
+
+_LEN_FORMATS = {
+    0xd9: '>B', 0xda: '>H', 0xdb: '>I',
+    0xc4: '>B', 0xc5: '>H', 0xc6: '>I',
+    0xc7: '>B', 0xc8: '>H', 0xc9: '>I',
+    0xdc: '>H', 0xdd: '>I',
+    0xde: '>H', 0xdf: '>I',
+}
+
+_FIXEXT_SIZES = { 0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16 }
+
+
+# codecs offered to the gateway, in order of preference
+CODECS = { c.name: c for c in (PackCodec, JsonCodec) }
+
+
+def offer():
+    return list(CODECS)
+
+
+def decode(data, codec):
+    """Text frames are JSON, binary frames are decoded with codec."""
+    if isinstance(data, str):
+        return json.loads(data)
+    return codec.decode(data)
+
+
+def select(name):
+    """New codec instance (fresh intern tables) for name, JSON if unknown."""
+    return CODECS.get(name, JsonCodec)()
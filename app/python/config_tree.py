@@ -0,0 +1,135 @@
+import json
+
+
+# Operations on configuration trees (nested dicts and lists): partial
+# updates addressed by path, validation and chunked transfer.
+#
+# A path is a list of keys (dicts) and indices (lists) from the root,
+# e.g. [ 'views', 2, 'entities' ]; [] is the whole configuration.
+
+# JSON text per config_chunk message, small enough for the gateway
+CHUNK_SIZE = 4096
+
+
+def get(tree, path):
+    for key in path:
+        tree = tree[key]
+    return tree
+
+
+def put(tree, path, value):
+    """Copy of tree with the subtree at path replaced by value. Only the
+    containers along path are copied, the rest is shared."""
+    if not path:
+        return value
+    key, rest = path[0], path[1:]
+    if isinstance(tree, list):
+        copy = list(tree)
+        if key == len(copy):
+            copy.append(None)
+        copy[key] = put(copy[key], rest, value)
+    else:
+        copy = dict(tree or {})
+        copy[key] = put(copy.get(key), rest, value)
+    return copy
+
+
+def patch(tree, path, value):
+    """Copy of tree with the mapping value merged into the subtree at path:
+    keys in value replace those in the subtree, keys with value None are
+    removed."""
+    merged = dict(get(tree, path) or {})
+    for k, v in value.items():
+        if v is None:
+            merged.pop(k, None)
+        else:
+            merged[k] = v
+    return put(tree, path, merged)
+
+
+def affected_views(tree, path):
+    """Indices of the views a change at path can affect, None for all."""
+    if len(path) >= 2 and path[0] == 'views':
+        return { path[1] }
+    if len(path) >= 2 and path[0] == 'entities':
+        eid = path[1]
+        return { i for i, view in enumerate(tree.get('views', [])) if eid in view.get('entities', []) }
+    return None
+
+
+# schema: what the app relies on
+
+_NUMBER = (int, float)
+
+_APP = {
+    'ping-interval': _NUMBER,
+    'max-silence': _NUMBER,
+    'render-interval': _NUMBER,
+    'release': bool,
+    'gateway-rate-policy': bool,
+}
+
+_ENTITY = {
+    'name': str,
+    'icon': str,
+    'history': (bool, int),
+    'max-rate': _NUMBER,
+    'deadband': _NUMBER,
+    'window': _NUMBER,
+    'aggregate': str,
+}
+
+
+def _check(where, value, types, errors):
+    if not isinstance(value, types):
+        errors.append(f"{where}: {type(value).__name__} not expected")
+        return False
+    return True
+
+
+def _check_fields(where, mapping, schema, errors):
+    for key, types in schema.items():
+        if key in mapping and mapping[key] is not None:
+            _check(f"{where}.{key}", mapping[key], types, errors)
+
+
+def validate(cfg):
+    """List of problems (empty if none) with configuration cfg."""
+    errors = []
+    if not _check("configuration", cfg, dict, errors):
+        return errors
+    # empty sections are None in YAML
+    app = cfg.get('app') or {}
+    if _check("app", app, dict, errors):
+        _check_fields("app", app, _APP, errors)
+    views = cfg.get('views') or []
+    if _check("views", views, list, errors):
+        for i, view in enumerate(views):
+            where = f"views[{i}]"
+            if not _check(where, view, dict, errors):
+                continue
+            _check_fields(where, view, { 'icon': str }, errors)
+            eids = view.get('entities') or []
+            if _check(f"{where}.entities", eids, list, errors):
+                for j, eid in enumerate(eids):
+                    _check(f"{where}.entities[{j}]", eid, str, errors)
+    entities = cfg.get('entities') or {}
+    if _check("entities", entities, dict, errors):
+        for eid, entity in entities.items():
+            where = f"entities.{eid}"
+            entity = entity or {}
+            if _check(where, entity, dict, errors):
+                _check_fields(where, entity, _ENTITY, errors)
+                if entity.get('aggregate') not in (None, 'min', 'avg', 'max'):
+                    errors.append(f"{where}.aggregate: one of min, avg, max")
+    return errors
+
+
+def chunks(cfg, size=CHUNK_SIZE):
+    """cfg as config_chunk messages of at most size characters of JSON."""
+    text = json.dumps(cfg, separators=(',', ':'), default=str)
+    count = max(1, -(-len(text) // size))
+    return [
+        { 'tag': 'config_chunk', 'seq': i, 'count': count, 'data': text[i*size:(i+1)*size] }
+        for i in range(count)
+    ]
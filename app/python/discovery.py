@@ -0,0 +1,204 @@
+import asyncio
+from collections import deque
+
+from dom import document, console
+from utilities import config
+import metrics
+import messages
+import proxies
+
+
+# Registry of devices reported by the gateway (discovered messages, e.g. BLE
+# advertisements), keyed by address, for the Discovered Devices page.
+#
+# Repeated advertisements only update the registry (last seen, RSSI, count),
+# devices not seen for _TTL seconds are dropped. A message is logged when a
+# device is first seen, again at most every _RENOTIFY seconds, and no more
+# than _NOTIFY_BURST per minute in total. The page is refreshed once per
+# second while shown, with at most _MAX_ROWS rows (reused).
+
+_TTL = 300
+_RENOTIFY = 3600
+_NOTIFY_BURST = 5
+_MAX_ROWS = 100
+_PRUNE_INTERVAL = 10
+
+_ADDRESS_KEYS = ('address', 'mac', 'addr', 'id')
+
+_DEVICES = {}           # address -> _Device
+_NOTIFIED = deque(maxlen=_NOTIFY_BURST)    # times of the last messages
+_LAST_PRUNE = 0.0
+_ADVERTISEMENTS = metrics.counter("discovered")
+
+
+class _Device:
+
+    __slots__ = ('address', 'name', 'info', 'rssi', 'first_seen', 'last_seen', 'count', 'notified')
+
+    def __init__(self, address, t):
+        self.address = address
+        self.name = address
+        self.info = {}
+        self.rssi = None
+        self.first_seen = t
+        self.last_seen = t
+        self.count = 0
+        self.notified = None
+
+    def config(self):
+        """Entry for the devices section of the configuration."""
+        return { k: v for k, v in self.info.items() if k not in ('rssi',) + _ADDRESS_KEYS }
+
+
+def _address(device):
+    if isinstance(device, dict):
+        for key in _ADDRESS_KEYS:
+            if device.get(key):
+                return str(device[key])
+    return str(device)
+
+
+def seen(device):
+    """Record a discovered message; device: dict (address, name, rssi, ...) or str."""
+    t = metrics.now()
+    _ADVERTISEMENTS.inc()
+    address = _address(device)
+    d = _DEVICES.get(address)
+    if d is None:
+        d = _DEVICES[address] = _Device(address, t)
+    d.last_seen = t
+    d.count += 1
+    if isinstance(device, dict):
+        d.info = device
+        d.name = str(device.get('name') or address)
+        d.rssi = device.get('rssi', d.rssi)
+    if d.notified is None or t - d.notified > _RENOTIFY:
+        _notify(d, t)
+    if t - _LAST_PRUNE > _PRUNE_INTERVAL:
+        prune(t)
+
+
+def _notify(d, t):
+    if len(_NOTIFIED) == _NOTIFY_BURST and t - _NOTIFIED[0] < 60:
+        # busy, the page has them all
+        return
+    _NOTIFIED.append(t)
+    d.notified = t
+    messages.add(f"discovered: {d.name} ({d.address})")
+
+
+def prune(t=None):
+    """Drop devices not seen for _TTL seconds."""
+    global _LAST_PRUNE
+    t = metrics.now() if t is None else t
+    _LAST_PRUNE = t
+    for address in [ a for a, d in _DEVICES.items() if t - d.last_seen > _TTL ]:
+        del _DEVICES[address]
+
+
+def devices(search=''):
+    """Devices matching search (name or address), strongest signal first."""
+    search = search.lower()
+    found = [ d for d in _DEVICES.values() if search in d.name.lower() or search in d.address.lower() ]
+    found.sort(key=lambda d: -(d.rssi if isinstance(d.rssi, (int, float)) else -999))
+    return found
+
+
+# Discovered Devices page
+
+_VISIBLE = False
+_TASK = None
+_ROWS = []          # (tr, cells, button, texts shown), reused
+_SHOWN = []         # devices in the rows, by row index
+_BODY = None
+_SEARCH = None
+
+
+def set_visible(visible):
+    """Discovered Devices page shown or hidden."""
+    global _VISIBLE, _TASK
+    _VISIBLE = visible
+    if visible and _TASK is None:
+        _TASK = asyncio.ensure_future(_refresh_task())
+
+
+async def _refresh_task():
+    global _TASK
+    try:
+        while _VISIBLE:
+            try:
+                render()
+            except Exception as e:
+                console.log(f"***** discovery render: {e}")
+            await asyncio.sleep(1)
+    finally:
+        _TASK = None
+
+
+def _setup():
+    global _BODY, _SEARCH
+    _BODY = document.getElementById('discovered-list')
+    _SEARCH = document.getElementById('discovered-filter')
+    _SEARCH.oninput = proxies.create(lambda event: render())
+
+
+def _row(i):
+    tr = document.createElement('tr')
+    cells = []
+    for _ in range(5):
+        td = document.createElement('td')
+        tr.appendChild(td)
+        cells.append(td)
+    td = document.createElement('td')
+    button = document.createElement('button')
+    button.className = 'w3-button w3-small w3-blue'
+    button.innerText = 'Add'
+
+    async def add_event(event=None):
+        await add_to_config(_SHOWN[i])
+    button.onclick = proxies.create(add_event)
+    td.appendChild(button)
+    tr.appendChild(td)
+    return tr, cells, button, [ None ] * 7
+
+
+def render():
+    global _SHOWN
+    if _BODY is None:
+        _setup()
+    prune()
+    t = metrics.now()
+    _SHOWN = devices(_SEARCH.value or '')[:_MAX_ROWS]
+    configured = config.get('devices') or {}
+    while len(_ROWS) < len(_SHOWN):
+        row = _row(len(_ROWS))
+        _BODY.appendChild(row[0])
+        _ROWS.append(row)
+    for i, (tr, cells, button, shown) in enumerate(_ROWS):
+        hidden = i >= len(_SHOWN)
+        if hidden != shown[6]:
+            tr.hidden = shown[6] = hidden
+        if hidden:
+            continue
+        d = _SHOWN[i]
+        texts = (d.name, d.address, "-" if d.rssi is None else str(d.rssi),
+                 f"{t - d.last_seen:.0f} s", str(d.count))
+        # write only what changed
+        for j, (td, text) in enumerate(zip(cells, texts)):
+            if shown[j] != text:
+                td.innerText = shown[j] = text
+        in_config = d.address in configured
+        if shown[5] != in_config:
+            button.disabled = shown[5] = in_config
+            button.innerText = 'Added' if in_config else 'Add'
+
+
+async def add_to_config(d):
+    """Add device d to the configuration (devices section, by address)."""
+    # not at the top: gateway imports dom_manipulations, which imports us
+    import gateway
+    try:
+        await gateway.send({ 'tag': 'config_put', 'path': [ 'devices', d.address ], 'value': d.config() })
+        messages.add(f"added {d.name} ({d.address}) to the configuration")
+    except Exception as e:
+        console.log(f"***** discovery add {d.address}: {e}")
@@ -0,0 +1,12 @@
+import sys
+
+
+# The DOM the app renders to: the browser's under Pyodide, a headless
+# stand-in (headless.py) under CPython, e.g. for load tests and benchmarks.
+# App modules import document, window, ... from here instead of from js.
+
+if sys.platform == 'emscripten':
+    from js import document, window, console, Array
+    from pyodide.ffi import create_proxy, create_once_callable
+else:
+    from headless import document, window, console, Array, create_proxy, create_once_callable
@@ -1,11 +1,54 @@
-from js import document, window, console
-import yaml, json
+from dom import document, window, console
+import json
 
 from utilities import config
-from dom_manipulations import message, show_page
+from dom_manipulations import message, nav_event
+import config_tree
+import proxies
 import gateway
 
 
+async def yaml_module():
+    """PyYAML, loaded on first use: only backup and restore need it,
+    so it is not fetched at startup."""
+    try:
+        import yaml
+    except ImportError:
+        import pyodide_js
+        await pyodide_js.loadPackage("pyyaml")
+        import yaml
+    return yaml
+
+
+async def _yaml_dump(value, indent):
+    yaml = await yaml_module()
+    return yaml.dump(value, indent=indent)
+
+
+async def _json_dump(value, indent):
+    return json.dumps(value, indent=indent)
+
+
+async def _load(name, text):
+    """Parse a configuration file: JSON (e.g. from export) directly,
+    YAML with the libyaml based loader if PyYAML has it."""
+    if name.endswith('.json'):
+        return json.loads(text)
+    yaml = await yaml_module()
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(text, Loader=loader)
+
+
+async def send_config(value):
+    """Send configuration to the gateway, in config_chunk messages if large."""
+    chunks = config_tree.chunks(value)
+    if len(chunks) == 1:
+        await gateway.send({ "tag": "config_put", "value": value })
+        return
+    for chunk in chunks:
+        await gateway.send(chunk)
+
+
 def restore_config_event():
 
     async def restore_event(event=None):
@@ -20,10 +63,13 @@ def restore_config_event():
         file = file_handles[0]
         try:
             content = await file.getFile()
-            content = await content.text()
-            content = yaml.safe_load(content)
-            if content == None: content = {}
-            await gateway.send({ "tag": "config_put", "value": content })
+            value = await _load(content.name, await content.text())
+            if value == None: value = {}
+            errors = config_tree.validate(value)
+            if errors:
+                message(f"{content.name}: not restored\n" + "\n".join(errors))
+                return
+            await send_config(value)
         except Exception as e:
             console.log(f"***** restore_event: {e}")
         
@@ -33,7 +79,7 @@ def restore_config_event():
     file_select = document.getElementById("restore-config")
     file_select.disabled = False
     try:
-        file_select.onclick = restore_event
+        file_select.onclick = proxies.create(restore_event)
     except Exception as e:
         console.log(f"***** Add restore_event: {e}")
 
@@ -47,7 +93,7 @@ def backup_config_event(element_id, dumper):
             console.log("***** backup_event show", str(e))
             return
         
-        content = dumper(config.get(), indent=4)
+        content = await dumper(config.get(), indent=4)
 
         try:
             file = await file_handle.createWritable()
@@ -61,7 +107,7 @@ def backup_config_event(element_id, dumper):
     file_save = document.getElementById(element_id)
     file_save.disabled = False
     try:
-        file_save.onclick = backup_event
+        file_save.onclick = proxies.create(backup_event)
     except Exception as e:
         console.log(f"***** Add backup_event: {e}")
 
@@ -73,30 +119,30 @@ def configuration_editor_event():
     pass
 
 
+_NAV_EVENTS_ADDED = False
+
 def add_nav_events():
-    # right side menu events
-    configuration_editor_event()
-    backup_config_event("backup-config", yaml.dump)
-    backup_config_event("export-config", json.dumps)
-    restore_config_event()
+    global _NAV_EVENTS_ADDED
     if not config.get('app', 'release'):
         document.getElementById("export-config").classList.remove("hidden-link")
         document.getElementById("nav-terminal").classList.remove("hidden-link")
+        document.getElementById("nav-metrics").classList.remove("hidden-link")
 
+    # handlers are attached once, view links get theirs in create_views
+    if _NAV_EVENTS_ADDED:
+        return
+    _NAV_EVENTS_ADDED = True
+
+    # right side menu events
+    configuration_editor_event()
+    backup_config_event("backup-config", _yaml_dump)
+    backup_config_event("export-config", _json_dump)
+    restore_config_event()
 
-    def nav_event(event=None):
-        if event == None:
-            message("***** nav_event is None???")
-        else:
-            # drop the -nav prefix
-            # console.log(f"EVENT target = {event.currentTarget.id[4:]}")
-            show_page(event.currentTarget.id[4:])
-            event.preventDefault()
-    
     nav_icons = document.getElementById("nav-icons")
-    for nav in nav_icons.querySelectorAll(".link"):
+    for nav in nav_icons.querySelectorAll(".link:not(.view-link)"):
         try:
-            nav.onclick = nav_event
+            nav.onclick = proxies.create(nav_event)
         except Exception as e:
             console.log("***** Add nav: {e}")
 
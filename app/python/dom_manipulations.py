@@ -1,65 +1,187 @@
-from pyscript import Element
-from js import document, console
-from datetime import datetime
+from dom import document, console
+import asyncio
 
-from utilities import config, ids
-from dom_factory import make_nav, make_view, make_entities, make_entity
+import metrics
+import dom_render
+import messages
+import discovery
+import formats
+from proxies import Proxies
 
+from utilities import config
+from dom_factory import make_nav, make_view, make_entities, make_entity_list
 
-_MSG_COUNT = 0
 
-def message(msg):
-    global _MSG_COUNT
-    msg_div = document.createElement('div')
-    msg_div.className = 'w3-code'
-    dt = datetime.now().strftime("%H:%M:%S")
-    msg_div.innerText = msg
-    h_div = document.createElement('h4')
-    h_div.innerText = f"[{_MSG_COUNT:04d}] {dt}"
-    cont_div = document.createElement('div')
-    cont_div.appendChild(h_div)
-    cont_div.appendChild(msg_div)
-    cont_div.className = 'w3-panel w3-card w3-light-grey'
-    document.getElementById('messages').appendChild(cont_div)
+def message(msg, severity=None):
+    """Add msg to the Messages page (see messages.py)."""
+    messages.add(str(msg), severity)
 
 
-def create_views():
+class _View:
+    """Elements of a view created by create_views, kept for incremental updates.
+
+    Views are materialized lazily: entity elements are only created (hydrated)
+    the first time the view is shown. entities is the index used by dom_render
+    to write state updates without DOM searches.
+    """
+
+    def __init__(self, id, nav, element, entities_e):
+        self.id = id
+        self.icon = None
+        self.nav = nav
+        self.element = element
+        self.entities_e = entities_e
+        # entities to show, from the configuration
+        self.eids = []
+        self.hydrated = False
+        # eid -> ((icon, name), entity element, value element), in display order
+        self.entities = {}
+        # eid -> raw value shown
+        self.rendered = {}
+        # eid -> CSS class of the value element ('' or absent: none), see formats
+        self.classes = {}
+        # eid -> (sparkline element, history version drawn), see dom_render
+        self.charts = {}
+        # event handlers, destroyed with the view
+        self.proxies = Proxies()
+
+
+# view id -> _View, in display order
+_VIEWS = {}
+
+
+def nav_event(event=None):
+    if event == None:
+        message("***** nav_event is None???")
+    else:
+        # drop the -nav prefix
+        # console.log(f"EVENT target = {event.currentTarget.id[4:]}")
+        show_page(event.currentTarget.id[4:])
+        event.preventDefault()
+
+
+def _add_view(id, main_element, nav_icons):
+    nav = make_nav('question_mark')
+    nav.id = f"nav-{id}"
+    # view links go before the menu
+    nav_icons.insertBefore(nav, nav_icons.querySelector(".w3-dropdown-hover"))
+    view_e = make_view()
+    view_e.id = id
+    view_e.hidden = True
+    entities_e = make_entities()
+    view_e.append(entities_e)
+    main_element.append(view_e)
+    view = _View(id, nav, view_e, entities_e)
+    nav.onclick = view.proxies.create(nav_event)
+    return view
+
+
+def _remove_view(view, main_element, nav_icons):
+    nav_icons.removeChild(view.nav)
+    main_element.removeChild(view.element)
+    # event handler proxies are destroyed explicitly (proxies.Proxies),
+    # element references are dropped so nothing of the view outlives it
+    view.entities.clear()
+    view.rendered.clear()
+    view.classes.clear()
+    view.charts.clear()
+    view.proxies.destroy()
+
+
+def reset():
+    """Forget all views (e.g. for a new document), nothing shown."""
+    for view in _VIEWS.values():
+        view.proxies.destroy()
+    _VIEWS.clear()
+    dom_render.reset()
+
+
+def _patch_nav(view, icon):
+    if icon != view.icon:
+        view.nav.replaceChildren(make_nav(icon).firstChild)
+        view.icon = icon
+
+
+def _hydrate(view):
+    """Create or update the entity elements of view to show view.eids,
+    reusing unchanged entity elements."""
+    view.hydrated = True
+    eids = view.eids
+    entities = {}
+    new = []
+    for eid in eids:
+        entity_config = config.get_entity_config(eid)
+        key = (entity_config.get('icon', ''), entity_config.get('name', eid))
+        old = view.entities.get(eid)
+        if old and old[0] == key:
+            entities[eid] = old
+        elif eid not in entities:
+            entities[eid] = None
+            new.append((eid, key))
+    created = set()
+    fragment = None
+    if new:
+        # build all new entities in one pass
+        fragment, elements = make_entity_list([ (eid, *key) for eid, key in new ])
+        for (eid, key), (entity_e, value_e) in zip(new, elements):
+            entities[eid] = (key, entity_e, value_e)
+            created.add(eid)
+    # remove entities no longer shown or replaced
+    for eid, (key, entity_e, value_e) in view.entities.items():
+        if entities.get(eid, (None, None))[1] is not entity_e:
+            view.entities_e.removeChild(entity_e)
+            view.rendered.pop(eid, None)
+            view.classes.pop(eid, None)
+            view.charts.pop(eid, None)
+    if fragment is not None:
+        view.entities_e.appendChild(fragment)
+    # reorder only if needed, appendChild moves existing elements
+    shown = [ eid for eid in view.entities if eid in entities and eid not in created ]
+    shown += [ eid for eid, key in new ]
+    if shown != list(entities):
+        for key, entity_e, value_e in entities.values():
+            view.entities_e.appendChild(entity_e)
+    view.entities = entities
+    # fill in new elements
+    dom_render.refresh(created)
+
+
+def create_views(only=None):
+    """Make the views match the configuration.
+    Views are keyed by position (view-1, ...), entities by eid: only what
+    changed is created or removed, other elements (and their values) stay.
+    Entities of hidden views are created when the view is first shown.
+    only: indices of the views whose entities may have changed (None: all)."""
     try:
         main_element = document.getElementById("main")
         nav_icons = document.getElementById("nav-icons")
+        views = config.get_views()
+        view_ids = [ f"view-{i}" for i in range(1, len(views)+1) ]
 
-        # remove all views & nav icons, in case create_views is called multiple times (configuration update)
-        # note: getElementsByClassName does not reliably return all elements!
-        for v in main_element.querySelectorAll(".view"):
-            if v.parentNode == main_element:
-                main_element.removeChild(v)
-        for v in nav_icons.querySelectorAll(".view-link"):
-            if v.parentNode == nav_icons:
-                nav_icons.removeChild(v)
+        for id in list(_VIEWS):
+            if id not in view_ids:
+                _remove_view(_VIEWS.pop(id), main_element, nav_icons)
+                if _CURRENT_PAGE == id:
+                    show_page('view-1')
 
-        views = config.get_views()
-        for i, view in enumerate(reversed(views)):
-            # view-1 is first view
-            i = len(views)-i
-            # add icon to navbar
-            nav  = make_nav(view.get('icon', 'question_mark'))
-            nav.id = f"nav-view-{i}"
-            nav_icons.prepend(nav)
-
-            # create view
-            view_e = make_view()
-            view_e.id = f"view-{i}"
-
-            entities_e = make_entities()
-            for eid in view.get('entities', []):
-                entity_config = config.get_entity_config(eid)
-                entity_e = make_entity(ids.css(eid), entity_config.get('icon', ''), entity_config.get('name', eid))
-                entities_e.append(entity_e)
-
-            # add entities
-            view_e.append(entities_e)
-            # add to main
-            main_element.append(view_e)
+        for i, (id, view) in enumerate(zip(view_ids, views)):
+            v = _VIEWS.get(id)
+            if v is None:
+                v = _VIEWS[id] = _add_view(id, main_element, nav_icons)
+            elif only is not None and i not in only:
+                continue
+            _patch_nav(v, view.get('icon', 'question_mark'))
+            v.eids = view.get('entities', [])
+            if v.hydrated or id == _CURRENT_PAGE:
+                _hydrate(v)
+
+        # formats changed: render those values again
+        changed = formats.configure(eid for view in views for eid in view.get('entities', []))
+        if changed:
+            for v in _VIEWS.values():
+                for eid in changed:
+                    v.rendered.pop(eid, None)
+            dom_render.refresh(changed)
     except Exception as e:
         console.log("***** create_views", str(e))
 
@@ -73,10 +195,32 @@ def show_page(id: str, last_page=None) -> str:
     prev = _CURRENT_PAGE
     # console.log(f"SHOW_PAGE {id}")
     try:
+        view = _VIEWS.get(id)
+        if view is not None and not view.hydrated:
+            _hydrate(view)
         for page in document.getElementById("main").children:
             page.hidden = page.id != id
             # console.log(f"PAGE {page.id}.hidden = {page.hidden}")
         _CURRENT_PAGE = last_page or id
+        # only the view shown receives updates
+        dom_render.show(view)
+        messages.set_visible(id == 'messages')
+        discovery.set_visible(id == 'discovered')
     except Exception as e:
         message(f"***** {show_page}: {e}")
-    return prev
\ No newline at end of file
+    return prev
+
+
+def update_metrics():
+    document.getElementById('metrics-report').innerText = metrics.report()
+
+
+async def metrics_task(interval=1):
+    """Refresh the metrics page while it is shown."""
+    while True:
+        await asyncio.sleep(interval)
+        if _CURRENT_PAGE == 'metrics':
+            try:
+                update_metrics()
+            except Exception as e:
+                console.log(f"***** metrics_task: {e}")
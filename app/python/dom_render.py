@@ -0,0 +1,167 @@
+import asyncio
+from dom import document, window, console, create_once_callable
+
+import metrics
+import history
+import formats
+
+
+# Batched DOM updates.
+# State updates are collected in _PENDING and written to the DOM once per
+# animation frame, or once per tick if an interval is configured. Only the
+# latest value per entity is kept (_LATEST) and only the view shown is
+# written to; hidden views catch up from _LATEST when they are shown.
+# Values are formatted with the entity's formatter (formats.py); values equal
+# to the raw value shown skip formatting and the write.
+# Sparklines of entities with a history are redrawn after the values, at
+# most _CHARTS_PER_FLUSH per flush; the rest wait for the next frame.
+
+_LATEST = {}        # eid -> latest raw value
+_PENDING = set()    # eids changed since the last flush
+_VIEW = None        # view shown (dom_manipulations._View), None if not a view
+_SCHEDULED = False
+_INTERVAL = None    # None: flush on animation frame, else seconds between flushes
+_FLUSH_TIME = metrics.histogram("dom flush")
+
+_NOTHING = object()
+
+_CHARTS = set()     # eids of the view shown whose sparkline is out of date
+_CHARTS_PER_FLUSH = 12
+_CHART_TIME = metrics.histogram("dom charts")
+
+
+def set_interval(interval=None):
+    """Flush every interval seconds, or on every animation frame if None."""
+    global _INTERVAL
+    _INTERVAL = float(interval) if interval else None
+
+
+def schedule(eid, value):
+    """Queue value for display. Replaces any value still pending for eid."""
+    _LATEST[eid] = value
+    _PENDING.add(eid)
+    _request_flush()
+
+
+def latest():
+    """eid -> latest value received"""
+    return _LATEST
+
+
+def refresh(eids):
+    """Render the latest values of eids again, e.g. for new elements."""
+    _PENDING.update(eid for eid in eids if eid in _LATEST)
+    if _PENDING:
+        _request_flush()
+
+
+def show(view):
+    """view is now shown (None: some other page), bring it up to date."""
+    global _VIEW
+    _VIEW = view
+    _CHARTS.clear()
+    if view is not None:
+        refresh(view.entities)
+
+
+def reset():
+    """Forget all values, nothing shown (e.g. for a new document)."""
+    _LATEST.clear()
+    _PENDING.clear()
+    show(None)
+
+
+def _request_flush():
+    global _SCHEDULED
+    if _SCHEDULED:
+        return
+    _SCHEDULED = True
+    try:
+        if _INTERVAL:
+            asyncio.get_event_loop().call_later(_INTERVAL, flush)
+        else:
+            window.requestAnimationFrame(create_once_callable(_animation_frame))
+    except Exception as e:
+        console.log(f"***** dom_render.schedule: {e}")
+        _SCHEDULED = False
+
+
+_RENDERED_ONCE = False
+
+def _first_render():
+    global _RENDERED_ONCE
+    _RENDERED_ONCE = True
+    metrics.phase("first render")
+
+
+def _animation_frame(timestamp=None):
+    flush()
+
+
+def flush():
+    """Write pending values of the view shown to the DOM."""
+    global _PENDING, _SCHEDULED
+    pending, _PENDING = _PENDING, set()
+    _SCHEDULED = False
+    view = _VIEW
+    if view is None:
+        # nothing shown, values stay in _LATEST
+        return
+    t = metrics.now()
+    entities = view.entities
+    rendered = view.rendered
+    classes = view.classes
+    formatter = formats.formatter
+    for eid in pending:
+        entity = entities.get(eid)
+        if entity is None:
+            continue
+        value = _LATEST[eid]
+        shown = rendered.get(eid, _NOTHING)
+        if shown is value or (type(shown) is type(value) and shown == value):
+            continue
+        rendered[eid] = value
+        try:
+            text, cls = formatter(eid)(value)
+            value_e = entity[2]
+            value_e.innerText = text
+            # also resets the class when thresholds were removed (cls None)
+            cls = cls or ''
+            if classes.get(eid, '') != cls:
+                value_e.className = f"entity-value {cls}" if cls else "entity-value"
+                classes[eid] = cls
+        except Exception as e:
+            console.log(f"***** dom_render.flush {eid}: {e}")
+    _FLUSH_TIME.add(metrics.now() - t)
+    _CHARTS.update(eid for eid in pending if eid in entities and history.get(eid))
+    if _CHARTS:
+        _draw_charts(view)
+    if not _RENDERED_ONCE:
+        _first_render()
+
+
+def _draw_charts(view):
+    t = metrics.now()
+    for _ in range(min(len(_CHARTS), _CHARTS_PER_FLUSH)):
+        eid = _CHARTS.pop()
+        h = history.get(eid)
+        entity = view.entities.get(eid)
+        if h is None or entity is None:
+            continue
+        chart, version = view.charts.get(eid, (None, None))
+        if version == h.version:
+            continue
+        try:
+            if chart is None:
+                chart = document.createElement('div')
+                chart.className = 'entity-chart'
+                entity[1].appendChild(chart)
+            chart.innerHTML = (
+                '<svg class="sparkline" viewBox="0 0 100 20" preserveAspectRatio="none">'
+                f'<polyline points="{h.polyline(100, 20)}"/></svg>')
+            view.charts[eid] = (chart, h.version)
+        except Exception as e:
+            console.log(f"***** dom_render chart {eid}: {e}")
+    _CHART_TIME.add(metrics.now() - t)
+    if _CHARTS:
+        _request_flush()
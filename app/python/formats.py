@@ -0,0 +1,108 @@
+from utilities import config
+
+
+# Per-entity value formatting, from the entity config:
+#
+#   unit: V                     appended to the value: "12.6 V"
+#   precision: 2                digits after the decimal point (numbers)
+#   enum: { 0: Off, 1: On }     labels for raw values
+#   thresholds:                 CSS class of the value element, first match
+#     - { below: 10, class: alarm }
+#     - { below: 20, class: warn }  (style.css styles warn and alarm)
+#
+# Specs are compiled to one function per entity by configure() (called from
+# create_views). A formatter maps the raw value to (text, css class); the
+# class is None if the entity has no thresholds (no class, same as '').
+
+_KEYS = ('unit', 'precision', 'enum', 'thresholds')
+
+# eid -> (spec, formatter), only entities with a format spec
+_FORMATTERS = {}
+
+
+def default(value):
+    if isinstance(value, float):
+        return f"{value:.1f}", None
+    return str(value), None
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _enum_lookup(enum):
+    # keys from YAML may be numbers or booleans, from JSON always strings
+    def lookup(value):
+        try:
+            if value in enum:
+                return enum[value]
+        except TypeError:
+            return None
+        key = str(value).lower() if isinstance(value, bool) else str(value)
+        return enum.get(key)
+    return lookup
+
+
+def _classify(thresholds):
+    rules = []
+    for t in thresholds:
+        if 'below' in t:
+            rules.append((float(t['below']), True, t.get('class', '')))
+        elif 'above' in t:
+            rules.append((float(t['above']), False, t.get('class', '')))
+    def classify(value):
+        if _number(value):
+            for limit, below, cls in rules:
+                if (value < limit) if below else (value > limit):
+                    return cls
+        return ''
+    return classify
+
+
+def make_formatter(spec):
+    """Formatter function for spec (the format keys of an entity config)."""
+    unit = spec.get('unit')
+    suffix = f" {unit}" if unit else ""
+    precision = spec.get('precision')
+    number = f"{{:.{int(precision)}f}}".format if precision is not None else None
+    enum = _enum_lookup(spec['enum']) if spec.get('enum') else None
+    classify = _classify(spec['thresholds']) if spec.get('thresholds') else None
+
+    def format_value(value):
+        label = enum(value) if enum else None
+        if label is not None:
+            text = str(label)
+        elif number is not None and _number(value):
+            text = number(value) + suffix
+        else:
+            text = default(value)[0] + suffix
+        return text, classify(value) if classify else None
+    return format_value
+
+
+def configure(eids):
+    """Compile the formatters of eids (all entities shown), drop others.
+    Returns the eids whose format changed."""
+    eids = set(eids)
+    changed = { eid for eid in _FORMATTERS if eid not in eids }
+    for eid in changed:
+        del _FORMATTERS[eid]
+    for eid in eids:
+        entity_config = config.get_entity_config(eid)
+        spec = { k: entity_config[k] for k in _KEYS if entity_config.get(k) is not None }
+        old = _FORMATTERS.get(eid)
+        if old is not None and old[0] == spec:
+            continue
+        if spec:
+            _FORMATTERS[eid] = (spec, make_formatter(spec))
+        else:
+            if old is None:
+                continue
+            del _FORMATTERS[eid]
+        changed.add(eid)
+    return changed
+
+
+def formatter(eid):
+    f = _FORMATTERS.get(eid)
+    return default if f is None else f[1]
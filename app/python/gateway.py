@@ -1,24 +1,98 @@
 import asyncio
+import hashlib
 import json
-from js import console, document
+from dom import console, document
 
-from wasm_websocket import connect
+import reconnect
 from dom_manipulations import message, create_views, show_page
 from dom_events import add_nav_events
-from utilities import config, ids
+import dom_render
+import history
+import policy
+import discovery
+from utilities import config
+import config_tree
+import codec
+import metrics
+from keepalive import Keepalive
+from outbox import Outbox
+import storage
 
 
 _REPORT_TRANSACTIONS = False
 
+# seconds between saving the state cache
+_STATE_SAVE_INTERVAL = 15
+
+
+# tag -> _Handler, built once as handlers are registered with @handler
+_HANDLERS = {}
+
+class _Handler:
+    __slots__ = ('fn', 'args', 'stats')
+
+    def __init__(self, tag, fn, args):
+        self.fn = fn
+        self.args = args
+        self.stats = metrics.histogram(f"handler {tag}")
+
+
+def handler(tag, args=None):
+    """Register coroutine fn(gateway, ...) to handle messages with tag.
+
+    By default message fields are passed as keyword arguments. With args
+    (tuple of field names) they are passed positionally in that order,
+    missing fields as None.
+
+    Usable from other modules, e.g.
+
+        @gateway.handler('my_tag', ('value',))
+        async def my_handler(gw, value): ...
+    """
+    def register(fn):
+        _HANDLERS[tag] = _Handler(tag, fn, tuple(args) if args else None)
+        return fn
+    return register
+
+
+def handler_stats():
+    """tag -> (number of messages handled, total handler time in seconds)"""
+    return { tag: (h.stats.count, h.stats.sum) for tag, h in _HANDLERS.items() if h.stats.count }
+
 
 class _Gateway:
     """Websocket communication with gateway (ESP32)"""
 
-    def __init__(self, url):
-        self._url = url
+    def __init__(self, urls):
+        # candidate gateway urls, tried in parallel; _url is the one connected
+        self._urls = [ urls ] if isinstance(urls, str) else list(urls)
+        self._url = None
+        self._backoff = reconnect.Backoff()
         self._ws = None
         self._ping_interval = 5
+        self._keepalive = Keepalive(self._ping_interval)
         self._splash_msg = None
+        # JSON until the gateway selects another codec (see _handle_codec)
+        self._codec = codec.JsonCodec()
+        # state version (sequence number) reported by the gateway,
+        # used to request only what changed after a reconnect
+        self._state_version = None
+        # messages sent while disconnected, replayed after reconnecting
+        self._outbox = Outbox()
+        self._connected = False
+        # assigned by the gateway, lets it resume the session after a reconnect
+        self._session = None
+        self._configured = False
+        self._config_hash = None
+        # state changed since last saved to the cache
+        self._state_dirty = False
+        # instrumentation, see metrics page
+        self._rx_count = metrics.counter("rx messages")
+        self._decode_time = metrics.histogram("rx decode")
+        self._rtt = metrics.histogram("ping rtt")
+        self._rtt_timeline = metrics.timeline("ping rtt timeline")
+        self._pings = metrics.counter("tx pings")
+        self._reconnect_time = metrics.histogram("reconnect")
 
 
     def splash_msg(self, msg, clear=False):
@@ -38,76 +112,171 @@ class _Gateway:
         assert isinstance(msg, dict)
         assert 'tag' in msg
         if _REPORT_TRANSACTIONS: console.log(f"send {msg}")
-        return await asyncio.wait_for(self._ws.send(json.dumps({ 'data': msg })), 10) 
+        self._keepalive.sent()
+        return await asyncio.wait_for(self._ws.send(self._codec.encode(msg)), 10) 
+
+
+    async def send(self, msg):
+        """Send msg, or queue it until reconnected if the connection is down."""
+        if self._connected:
+            try:
+                await self._send(msg)
+                return
+            except Exception as e:
+                console.log(f"***** gateway.send {msg.get('tag')}, queued: {e}")
+        self._outbox.put(msg)
 
 
     async def _ping_pong_task(self):
-        """Send pings at reglar intervals:
+        """Send pings only when needed:
         Gateway disconnects if no messages received for too long.
-        Webapp reconnects if connection dead.
+        Webapp reconnects if connection dead (detected by _recv).
+        No pings while data is flowing, unless we have sent nothing for
+        a while, see Keepalive.
         """
         while True:
-            if self._ws != None:
-                try:
-                    await asyncio.wait_for(self._send({ "tag": "ping" }), self._ping_interval)
-                    await asyncio.sleep(self._ping_interval)
-                except asyncio.TimeoutError:
-                    console.log(f"***** ping_pong_task: timeout - disconnected?")
-            
+            if self._ws == None:
+                await asyncio.sleep(1)
+                continue
+            due = self._keepalive.ping_due()
+            if due > 0:
+                await asyncio.sleep(due)
+                continue
+            try:
+                ts = self._keepalive.ping()
+                self._pings.inc()
+                await asyncio.wait_for(self._send({ "tag": "ping", "ts": ts }), self._ping_interval)
+            except asyncio.TimeoutError:
+                console.log(f"***** ping_pong_task: timeout - disconnected?")
+            except Exception as e:
+                console.log(f"***** ping_pong_task: {e}")
+                await asyncio.sleep(1)
+
+
+    def _restore_cache(self):
+        """Show the app from the cached configuration and state, if any."""
+        value = storage.load('config')
+        if not value:
+            return
+        self.splash_msg(f"Cached configuration")
+        self._apply_config(value)
+        metrics.phase("views from cache")
+        state = storage.load('state', {})
+        self._state_version = state.get('version')
+        for eid, value in state.get('values', {}).items():
+            dom_render.schedule(eid, value)
+
+
+    async def _save_state_task(self):
+        """Save the latest state for the next startup, at most every _STATE_SAVE_INTERVAL."""
+        while True:
+            await asyncio.sleep(_STATE_SAVE_INTERVAL)
+            if self._state_dirty:
+                self._state_dirty = False
+                storage.save('state', { 'version': self._state_version, 'values': dom_render.latest() })
 
 
     async def run(self):
         # get this going and never stop
         asyncio.create_task(self._ping_pong_task())
+        asyncio.create_task(self._save_state_task())
 
         startup = True
+        disconnected = None
+
+        # show the app right away if we have the configuration from last time
+        try:
+            self._restore_cache()
+        except Exception as e:
+            # e.g. cached by an older version, start without it (for good)
+            console.log(f"***** gateway cache: {e}, cleared")
+            storage.save('config', None)
+            storage.save('state', None)
+            self._configured = False
+            self._state_version = None
 
         # connect / reconnect loop
         while True:
             # try connecting until successful
-            self.splash_msg(f"Attempting connection to {self._url}")
+            urls = reconnect.candidates(self._urls)
+            self.splash_msg(f"Attempting connection to {', '.join(urls)}")
             while True:
                 try:
-                    self._ws = await connect(self._url)
-                    await asyncio.wait_for(self._send({ "tag": "ping" }), 240) 
+                    self._codec = codec.JsonCodec()
+                    self._url, self._ws = await reconnect.connect_first(urls)
+                    await asyncio.wait_for(self._send({ "tag": "ping" }), 10) 
+                    await self._send({ "tag": "codec_offer", "codecs": codec.offer() })
+                    if self._session is not None:
+                        await self._send({ "tag": "session_resume", "id": self._session })
+                    if disconnected is not None:
+                        self._reconnect_time.add(metrics.now() - disconnected)
+                    self._backoff.reset()
+                    reconnect.save_last_good(self._url)
                     break
                 except asyncio.TimeoutError as e:
                     console.log(f"***** gateway.run timeout: {e}")
                 except Exception as e:
                     console.log(f"***** gateway.run connecting: {e}")
-                self.splash_msg(f"Is the gateway up?")
-                try:
-                    await self._ws.close()
-                except Exception as e:
-                    console.log(f"***** gateway.run close: {e}")
+                if self._ws is not None:
+                    try:
+                        await self._ws.close()
+                    except Exception as e:
+                        console.log(f"***** gateway.run close: {e}")
+                    self._ws = None
+                delay = self._backoff.next()
+                self.splash_msg(f"Is the gateway up? Retry in {delay:.0f}s")
+                await asyncio.sleep(delay)
+            self.splash_msg(f"Connected to {self._url}")
+            self._connected = True
+            metrics.phase("connected")
 
             try:
                 if startup:
                     # wait for config_put to get the configuration & show the app screen
-                    await self._send({ 'tag': 'config_get' })
+                    # the gateway may skip sending it if the hash matches the cached one
+                    msg = { 'tag': 'config_get' }
+                    if self._config_hash:
+                        msg['hash'] = self._config_hash
+                    await self.send(msg)
+                    if self._configured:
+                        # from cache: changes since the cached state
+                        await self._state_get_all(delta=True)
+                        await self._send_rate_policy()
                     startup = False
                 else:
                     # make sure state is up-to-date after a possibily long disconnect
-                    await self._send({ 'tag': 'state_get_all' })
+                    await self._state_get_all(delta=True)
+                    await self._send_rate_policy()
                     show_page(last_page)
+                # whatever was sent while disconnected, in order
+                for msg in self._outbox.drain():
+                    await self.send(msg)
 
                 # receive messages until disconnect detected        
                 await self._recv()
+                self._connected = False
                 console.log(f"***** Gateway disconnected")
+                disconnected = metrics.now()
                 last_page = show_page('splashscreen')
                 self.splash_msg(f"Gateway disconnected", True)
             except Exception as e:
+                self._connected = False
                 console.log(f"***** gateway.run finishing: {e}")
 
 
     async def _recv(self):
         # perpetually receive messages - until connection breaks
+        keepalive = self._keepalive
+        keepalive.reset()
         while True:
             try:
-                msg = await asyncio.wait_for(self._ws.recv(), timeout=self._ping_interval)
-                if _REPORT_TRANSACTIONS: console.log(f"recv {msg}")
+                # everything received since the last call, in one await
+                msgs = await self._ws.recv_many(timeout=keepalive.recv_timeout())
             except asyncio.TimeoutError:
-                console.log(f"GATEWAY TIMEOUT: lost connection, ping interval = {self._ping_interval}")
+                if not keepalive.dead():
+                    # probe (ping) on its way, wait for the answer
+                    continue
+                console.log(f"GATEWAY TIMEOUT: lost connection, timeout = {keepalive.timeout:.2f}s")
                 try:
                     await self._ws.close()
                 except Exception:
@@ -115,74 +284,191 @@ class _Gateway:
                 return
             except Exception as e:
                 console.log(f"***** gateway recv: {e}")
+                if self._ws.closed:
+                    return
                 continue
 
-            msg = json.loads(msg)
-            # console.log("GATEWAY got", str(msg))
-            try:
-                tag = msg["tag"] 
-                method = getattr(self, f"_handle_{tag}")
-            except KeyError:
-                console.log(f"***** Message has no tag attribute: {msg}")
-                continue
-            except AttributeError:
-                console.log(f"***** No handler for {tag}: {msg}")
-                continue
-            try:
-                del msg["tag"]
-                # console.log(f"CALL {method}")
-                await method(**msg)
-            except Exception as e:
-                console.log(f"***** gateway - error handling: {msg}", str(e))
+            keepalive.received()
+            self._rx_count.inc(len(msgs))
+            for msg in msgs:
+                if _REPORT_TRANSACTIONS: console.log(f"recv {msg}")
+                await self._dispatch(msg)
+
+
+    async def _dispatch(self, msg):
+        t = metrics.now()
+        try:
+            msg = codec.decode(msg, self._codec)
+        except Exception as e:
+            console.log(f"***** gateway decode: {e}")
+            return
+        self._decode_time.add(metrics.now() - t)
+        # console.log("GATEWAY got", str(msg))
+        try:
+            tag = msg.pop("tag")
+            h = _HANDLERS[tag]
+        except (KeyError, AttributeError):
+            console.log(f"***** No tag or no handler for {msg}")
+            return
+        t = metrics.now()
+        try:
+            if h.args:
+                await h.fn(self, *[ msg.get(a) for a in h.args ])
+            else:
+                await h.fn(self, **msg)
+        except Exception as e:
+            console.log(f"***** gateway - error handling {tag}: {msg}", str(e))
+        h.stats.add(metrics.now() - t)
+
+
+    @handler('config_put')
+    async def _handle_config_put(self, value, path=[]):
+        """Full configuration, or the subtree at path (see config_tree)."""
+        await self._update_config(config_tree.put, value, path)
 
 
-    async def _handle_config_put(self, value, path=[]):
-        # accept only full configuration
-        assert len(path) == 0
+    @handler('config_patch')
+    async def _handle_config_patch(self, value, path=[]):
+        """Keys of value merged into the mapping at path."""
+        await self._update_config(config_tree.patch, value, path)
+
+
+    async def _update_config(self, op, value, path):
+        if path and not self._configured:
+            # nothing to apply it to, get everything
+            await self.send({ 'tag': 'config_get' })
+            return
+        base = config.get() if self._configured else {}
+        # views (indices) to update, None: all
+        views = config_tree.affected_views(base, path)
+        value = op(base, path, value)
+
+        if self._configured and value == config.get():
+            # e.g. resent after a reconnect, nothing to rebuild
+            return
+
+        self._apply_config(value, views)
+        metrics.phase("views from gateway")
+        storage.save('config', value)
+
+        # get current state - for new entities too
+        await self._state_get_all(delta=False)
+        await self._send_rate_policy()
+
 
-        # notify user that we are updating the app
-        self.splash_msg(f"Configuration received")
-        last_page = show_page('splashscreen')
+    @handler('config_unchanged')
+    async def _handle_config_unchanged(self):
+        # answer to config_get with the hash of our cached configuration
+        pass
+
+
+    def _apply_config(self, value, views=None):
+        # first configuration: notify user that we are setting up the app
+        # later changes are applied in place, to views (indices) only if given
+        incremental = self._configured
+        if not incremental:
+            self.splash_msg(f"Configuration received")
+            last_page = show_page('splashscreen')
         
         config.set(value)
+        history.configure()
+        policy.configure()
+        self._config_hash = hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
         self._ping_interval = float(config.get('app', 'ping-interval')) or 8
-
-        # update view to match new config
-        self.splash_msg(f"Create views")
-        create_views()
-        self.splash_msg(f"Attach event handlers")
+        self._keepalive.interval = self._ping_interval
+        self._keepalive.max_silence = config.get('app', 'max-silence')
+        dom_render.set_interval(config.get('app', 'render-interval'))
+
+        # update views to match new config
+        if not incremental: self.splash_msg(f"Create views")
+        create_views(views if incremental else None)
+        if not incremental: self.splash_msg(f"Attach event handlers")
         add_nav_events()
-        self.splash_msg(f"Setup Complete")
 
-        # show the last selected page (defaults to view-1 on app startup)
-        show_page(last_page)
+        if not incremental:
+            self.splash_msg(f"Setup Complete")
+            # show the last selected page (defaults to view-1 on app startup)
+            show_page(last_page)
+        self._configured = True
+
+
+    async def _state_get_all(self, delta):
+        """Request state snapshot, delta: only changes since _state_version."""
+        msg = { 'tag': 'state_get_all' }
+        policy.resync()
+        if delta and self._state_version is not None:
+            msg['since'] = self._state_version
+        await self.send(msg)
+
 
-        # get current state
-        await self._send({ "tag": "state_get_all" })
+    async def _send_rate_policy(self):
+        """Let the gateway throttle at the source, if enabled (see policy.py)."""
+        policies = policy.wire()
+        if policies:
+            await self.send({ 'tag': 'rate_policy', 'policies': policies })
 
 
-    async def _handle_state_update(self, eid, value, all=False):
-        for entity in document.getElementsByClassName(ids.css(eid)):
-            if isinstance(value, float):
-                value = f"{value:.1f}"
-            entity.querySelector('.entity-value').innerText = value
+    @handler('state_update', ('eid', 'value', 'version'))
+    async def _handle_state_update(self, eid, value, version=None):
+        # coalesced, written to the DOM on the next animation frame
+        policy.schedule(eid, value)
+        history.record(eid, value)
+        self._state_dirty = True
+        if version is not None:
+            self._state_version = version
 
 
+    @handler('state_update_batch', ('updates', 'version', 'delta'))
+    async def _handle_state_update_batch(self, updates, version=None, delta=False):
+        """Many updates in one frame, updates is a list of [eid, value] pairs.
+        delta: updates are changes since the version sent with state_get_all,
+        otherwise updates is a full snapshot."""
+        schedule, record = policy.schedule, history.record
+        for eid, value in updates:
+            schedule(eid, value)
+            record(eid, value)
+        self._state_dirty = True
+        if version is not None:
+            self._state_version = version
+
+
+    @handler('session', ('id',))
+    async def _handle_session(self, id):
+        # session id to resume with after a reconnect
+        self._session = id
+
+
+    @handler('codec', ('name',))
+    async def _handle_codec(self, name):
+        # gateway selected the codec from our codec_offer
+        self._codec = codec.select(name)
+        console.log(f"gateway codec: {self._codec.name}")
+
+
+    @handler('info', ('category', 'msg'))
     async def _handle_info(self, category, msg):
-        message(f"{category}: {msg}")
+        message(f"{category}: {msg}", category)
 
 
+    @handler('discovered', ('device',))
     async def _handle_discovered(self, device):
-        message(f"discovered: {device}")
+        # registry and Discovered Devices page, notifies new devices
+        discovery.seen(device)
 
 
+    @handler('ping')
     async def _handle_ping(self):
         await self._send({ "tag": "pong" })
 
 
-    async def _handle_pong(self):
-        # nothing to do - recv task already took note
-        pass
+    @handler('pong', ('ts',))
+    async def _handle_pong(self, ts=None):
+        # recv task already took note, just record the round trip time
+        # ts: our ping timestamp, if echoed by the gateway
+        rtt = self._keepalive.pong(ts)
+        if rtt is not None:
+            self._rtt.add(rtt)
+            self._rtt_timeline.add(rtt)
 
 
 _GATEWAY = None
@@ -190,15 +476,17 @@ _GATEWAY = None
 async def send(msg):
     # backdoor to send without reference to gateway
     # gateway is singleton
+    # queued while disconnected
     global _GATEWAY
-    await _GATEWAY._send(msg)
+    await _GATEWAY.send(msg)
 
-async def gateway_task(url='ws://10.0.0.8/ws'):
+async def gateway_task(urls='ws://10.0.0.8/ws'):
     """Communicate with gateway. Automatic reconnects. 
+    urls: gateway url or list of candidates (first to answer is used).
     This never returns.
     Gateway is a SINGLETON!
     """
     global _GATEWAY
-    _GATEWAY = _Gateway(url)
+    _GATEWAY = _Gateway(urls)
     await _GATEWAY.run()
 
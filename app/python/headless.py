@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import os
+import sys
+from html import escape
+from html.parser import HTMLParser
+
+
+# Headless stand-in for the parts of the browser DOM the app uses, so the
+# webapp runs under CPython (see dom.py). Not a browser: no layout, no CSS,
+# selectors are limited to compound simple selectors (tag, #id, .class and
+# :not(...)), no combinators. Attributes other than id, class, hidden,
+# disabled and value are not kept.
+#
+# The utilities package (config, ids) is fetched separately in the browser;
+# if it cannot be imported, the stand-in in headless_utilities is used.
+
+_INDEX_HTML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'index.html')
+_VOID = { 'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr' }
+
+
+class _ClassList:
+
+    def __init__(self, element):
+        self._e = element
+
+    def _names(self):
+        return self._e.className.split()
+
+    def contains(self, name):
+        return name in self._names()
+
+    def add(self, *names):
+        self._e.className = " ".join(self._names() + [ n for n in names if n not in self._names() ])
+
+    def remove(self, *names):
+        self._e.className = " ".join(n for n in self._names() if n not in names)
+
+
+class _Style:
+    """element.style: any property, stored as set"""
+
+
+class Element:
+
+    def __init__(self, tag, attrs=None):
+        self.tagName = tag.upper()
+        self.id = ''
+        self.className = ''
+        self.hidden = False
+        self.disabled = False
+        self.onclick = None
+        self.style = _Style()
+        self.scrollTop = 0
+        self.clientHeight = 0
+        self.title = ''
+        self.value = attrs.get('value', '') if attrs else ''
+        self.parentNode = None
+        self.children = []
+        self._text = ''
+        for k, v in (attrs or {}).items():
+            if k == 'class':
+                self.className = v or ''
+            elif k in ('hidden', 'disabled'):
+                setattr(self, k, True)
+            elif k == 'id':
+                self.id = v
+        self.classList = _ClassList(self)
+        if tag == 'template':
+            self.content = Element('#fragment')
+
+    def __repr__(self):
+        return f"<{self.tagName.lower()} id={self.id!r} class={self.className!r}>"
+
+    # text
+
+    @property
+    def innerText(self):
+        return self._text + "".join(c.innerText for c in self.children)
+
+    @innerText.setter
+    def innerText(self, text):
+        self._detach_all()
+        self._text = str(text)
+
+    textContent = innerText
+
+    @property
+    def innerHTML(self):
+        source = self.content if self.tagName == 'TEMPLATE' else self
+        return escape(source._text, quote=False) + "".join(c.outerHTML for c in source.children)
+
+    @innerHTML.setter
+    def innerHTML(self, html):
+        target = self.content if self.tagName == 'TEMPLATE' else self
+        target._detach_all()
+        target._text = ''
+        _Parser(target).feed(html)
+
+    @property
+    def outerHTML(self):
+        tag = self.tagName.lower()
+        attrs = "".join(f' {k}="{escape(v)}"' for k, v in
+                        (('id', self.id), ('class', self.className), ('value', self.value)) if v)
+        attrs += "".join(f" {k}" for k in ('hidden', 'disabled') if getattr(self, k))
+        if tag in _VOID:
+            return f"<{tag}{attrs}>"
+        return f"<{tag}{attrs}>{self.innerHTML}</{tag}>"
+
+    # tree
+
+    def _detach_all(self):
+        for c in self.children:
+            c.parentNode = None
+        self.children = []
+
+    def _adopt(self, child):
+        if child.tagName == '#FRAGMENT':
+            # the children move, the fragment is left empty
+            children, child.children = child.children, []
+            return children
+        if child.parentNode is not None:
+            child.parentNode.removeChild(child)
+        return [ child ]
+
+    def appendChild(self, child):
+        for c in self._adopt(child):
+            c.parentNode = self
+            self.children.append(c)
+        return child
+
+    def append(self, *children):
+        for child in children:
+            self.appendChild(child)
+
+    def prepend(self, *children):
+        for child in reversed(children):
+            self.insertBefore(child, self.firstChild)
+
+    def insertBefore(self, child, ref):
+        if ref is None:
+            return self.appendChild(child)
+        for c in reversed(self._adopt(child)):
+            c.parentNode = self
+            self.children.insert(self.children.index(ref), c)
+        return child
+
+    def removeChild(self, child):
+        self.children.remove(child)
+        child.parentNode = None
+        return child
+
+    def replaceChildren(self, *children):
+        self._detach_all()
+        self._text = ''
+        self.append(*children)
+
+    @property
+    def firstChild(self):
+        return self.children[0] if self.children else None
+
+    # search
+
+    def _descendants(self):
+        for c in self.children:
+            yield c
+            yield from c._descendants()
+
+    def querySelectorAll(self, selector):
+        matches = _selector(selector)
+        return [ e for e in self._descendants() if matches(e) ]
+
+    def querySelector(self, selector):
+        matches = _selector(selector)
+        return next((e for e in self._descendants() if matches(e)), None)
+
+    def getElementById(self, id):
+        return next((e for e in self._descendants() if e.id == id), None)
+
+    def getElementsByClassName(self, name):
+        return [ e for e in self._descendants() if e.classList.contains(name) ]
+
+
+def _selector(selector):
+    """Matcher for a compound simple selector, e.g. a.link:not(.view-link)"""
+    selector = selector.strip()
+    if selector.startswith(':not(') or ':not(' in selector:
+        base, _, rest = selector.partition(':not(')
+        inner = rest[:-1]
+        base_match = _selector(base) if base else (lambda e: True)
+        inner_match = _selector(inner)
+        return lambda e: base_match(e) and not inner_match(e)
+    tag, ids, classes, part, kind = None, [], [], '', 'tag'
+    for ch in selector + '\0':
+        if ch in '.#\0':
+            if part:
+                if kind == 'tag': tag = part.upper()
+                elif kind == 'id': ids.append(part)
+                else: classes.append(part)
+            part, kind = '', { '.': 'class', '#': 'id', '\0': None }[ch]
+        else:
+            part += ch
+    def matches(e):
+        if tag and e.tagName != tag: return False
+        if any(e.id != i for i in ids): return False
+        return all(e.classList.contains(c) for c in classes)
+    return matches
+
+
+class _Parser(HTMLParser):
+
+    def __init__(self, root):
+        super().__init__(convert_charrefs=True)
+        self._stack = [ root ]
+
+    def handle_starttag(self, tag, attrs):
+        e = Element(tag, dict(attrs))
+        self._stack[-1].appendChild(e)
+        if tag not in _VOID:
+            self._stack.append(e)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack)-1, 0, -1):
+            if self._stack[i].tagName == tag.upper():
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data):
+        parent = self._stack[-1]
+        if data.strip():
+            if parent.children:
+                # text after child elements, keep it in a span
+                span = Element('span')
+                span._text = data
+                parent.appendChild(span)
+            else:
+                parent._text += data
+
+
+class Document(Element):
+
+    def __init__(self, html=None):
+        super().__init__('#document')
+        if html:
+            _Parser(self).feed(html)
+
+    def createElement(self, tag):
+        return Element(tag)
+
+
+class _Event:
+
+    def __init__(self, target):
+        self.currentTarget = target
+        self.target = target
+
+    def preventDefault(self):
+        pass
+
+
+def click(element):
+    """Simulate a click on element (calls its onclick handler)."""
+    if element.onclick is not None:
+        result = element.onclick(_Event(element))
+        if asyncio.iscoroutine(result):
+            return asyncio.ensure_future(result)
+
+
+class _Window:
+
+    def requestAnimationFrame(self, callback):
+        loop = asyncio.get_event_loop()
+        loop.call_later(1/60, lambda: callback(loop.time() * 1000))
+
+
+class _Console:
+
+    def __init__(self):
+        self._log = logging.getLogger('webapp')
+
+    def log(self, *args):
+        self._log.info(" ".join(str(a) for a in args))
+
+
+class Array:
+
+    class _List(list):
+        def to_py(self):
+            return list(self)
+
+    @staticmethod
+    def from_(iterable):
+        return Array._List(iterable.children if isinstance(iterable, Element) else iterable)
+
+
+class _Proxy:
+    """Like a pyodide proxy: callable until destroyed."""
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def __call__(self, *args):
+        if self._fn is None:
+            raise RuntimeError("headless: proxy called after it was destroyed")
+        return self._fn(*args)
+
+    def destroy(self):
+        self._fn = None
+
+
+def create_proxy(fn):
+    return _Proxy(fn)
+
+
+def create_once_callable(fn):
+    return fn
+
+
+def _install_utilities():
+    try:
+        import utilities
+    except ModuleNotFoundError:
+        import headless_utilities
+        from headless_utilities import config, ids
+        sys.modules['utilities'] = headless_utilities
+        sys.modules['utilities.config'] = config
+        sys.modules['utilities.ids'] = ids
+
+
+def load(path=_INDEX_HTML):
+    """Replace the document with the one parsed from path (default: app/index.html)."""
+    global document
+    with open(path) as f:
+        document.__init__(f.read())
+    return document
+
+
+_install_utilities()
+
+document = Document()
+window = _Window()
+console = _Console()
+load()
@@ -0,0 +1,4 @@
+# Stand-in for the utilities package (config, ids) when running natively
+# without it, e.g. in tests, benchmarks and load tests. Installed as
+# "utilities" by headless.py if the real package cannot be imported.
+# Implements only what the app uses.
@@ -0,0 +1,30 @@
+# Configuration: app settings, views (icon, entity ids) and entity configs
+#
+#   app: { ping-interval: 5, ... }
+#   views: [ { icon: ..., entities: [ eid, ... ] }, ... ]
+#   entities: { eid: { name: ..., icon: ..., ... }, ... }
+
+_CONFIG = {}
+
+
+def set(value):
+    global _CONFIG
+    _CONFIG = value or {}
+
+
+def get(*path):
+    """Value at path (keys), None if missing; the whole configuration if no path."""
+    value = _CONFIG
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def get_views():
+    return get('views') or []
+
+
+def get_entity_config(eid):
+    return (get('entities') or {}).get(eid) or {}
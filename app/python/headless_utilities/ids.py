@@ -0,0 +1,6 @@
+import re
+
+
+def css(eid):
+    """eid as a CSS class name, e.g. sensor.battery_v -> sensor-battery_v"""
+    return re.sub(r'[^A-Za-z0-9_-]', '-', eid)
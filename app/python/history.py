@@ -0,0 +1,122 @@
+from array import array
+
+import metrics
+from utilities import config
+
+
+# Recent values of entities with a history (entity config "history: true"
+# or "history: <points>"), for sparklines.
+#
+# Values and times are kept in float32 arrays (8 bytes per point). When an
+# entity's buffer is full, its older half is downsampled (pairs averaged),
+# so recent data keeps full resolution and older data progressively less.
+# All buffers together stay within _BUDGET bytes.
+
+_BUDGET = 256 * 1024    # bytes, all entities
+_POINTS = 120           # default points per entity
+_MIN_POINTS = 16
+
+_T0 = metrics.now()
+
+# eid -> History, only entities with a history
+_HISTORIES = {}
+
+
+def _size(points):
+    # a multiple of 4: the older half is averaged in pairs
+    return max(_MIN_POINTS, points & ~3)
+
+
+class History:
+
+    __slots__ = ('size', 'times', 'values', 'version')
+
+    def __init__(self, size):
+        self.size = _size(size)
+        self.times = array('f')     # seconds since _T0
+        self.values = array('f')
+        # incremented on every change, lets the renderer skip redraws
+        self.version = 0
+
+    def add(self, value, t):
+        if len(self.values) >= self.size:
+            self._downsample()
+        self.times.append(t)
+        self.values.append(value)
+        self.version += 1
+
+    def _downsample(self):
+        # halve the resolution of the older half
+        half = self.size // 2
+        v, t = self.values, self.times
+        self.values = array('f', [ (v[i] + v[i+1]) / 2 for i in range(0, half, 2) ]) + v[half:]
+        self.times = array('f', [ t[i+1] for i in range(0, half, 2) ]) + t[half:]
+
+    def __len__(self):
+        return len(self.values)
+
+    def polyline(self, width=100, height=20):
+        """SVG polyline points, scaled to width x height, y up."""
+        n = len(self.values)
+        if n < 2:
+            return ""
+        t, v = self.times, self.values
+        t0, t1 = t[0], t[-1]
+        lo, hi = min(v), max(v)
+        xs = width / ((t1 - t0) or 1)
+        ys = height / ((hi - lo) or 1)
+        # at most one point per x unit
+        step = max(1, n // width)
+        return " ".join(
+            f"{(t[i]-t0)*xs:.1f},{height-(v[i]-lo)*ys:.1f}" for i in range(0, n, step))
+
+
+def configure():
+    """Set up histories for the entities in the configuration. Existing
+    data is kept for entities that still have a history."""
+    wanted = {}
+    for view in config.get_views():
+        for eid in view.get('entities', []):
+            points = config.get_entity_config(eid).get('history')
+            if points:
+                wanted[eid] = _POINTS if points is True else int(points)
+    # shrink evenly if over budget
+    total = sum(wanted.values()) * 8
+    scale = min(1, _BUDGET / total) if total else 1
+    for eid in list(_HISTORIES):
+        if eid not in wanted:
+            del _HISTORIES[eid]
+    for eid, points in wanted.items():
+        size = int(points * scale)
+        h = _HISTORIES.get(eid)
+        if h is None:
+            _HISTORIES[eid] = History(size)
+        else:
+            h.size = _size(size)
+
+
+def record(eid, value):
+    """Add value to the history of eid, if it has one and value is numeric."""
+    h = _HISTORIES.get(eid)
+    if h is None:
+        return
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return
+    h.add(value, metrics.now() - _T0)
+
+
+def get(eid):
+    """History of eid, None if it has none."""
+    return _HISTORIES.get(eid)
+
+
+def reset():
+    """Drop all histories."""
+    _HISTORIES.clear()
+
+
+def memory():
+    """Bytes used by all histories."""
+    return sum(len(h) * 8 for h in _HISTORIES.values())
@@ -0,0 +1,114 @@
+from metrics import now
+
+
+class Keepalive:
+    """Adaptive keepalive for the gateway connection.
+
+    The gateway drops clients it has not heard from for a while, and the
+    webapp may have nothing else to send: a ping is due when nothing was sent
+    for max_silence seconds (default twice the interval, half the pings of
+    the baseline, which pinged every interval), busy or idle.
+
+    When data stops arriving, a probe is due sooner, after interval/2
+    seconds of silence. Not after a pong though: on an idle link the pong is
+    all that arrives, and the max_silence ping is the probe. The connection
+    is considered dead if nothing arrives within the retransmission timeout
+    after a probe. The timeout is derived from measured ping round trip times
+    the way TCP does it (smoothed RTT + 4 * RTT variance, RFC 6298), clamped
+    to [min_timeout, interval].
+    """
+
+    def __init__(self, interval=5, min_timeout=0.5, max_silence=None):
+        self.interval = interval
+        self.min_timeout = min_timeout
+        self._max_silence = max_silence
+        self._srtt = None
+        self._rttvar = None
+        self._ping_ts = None        # time last ping was sent
+        self.reset()
+
+    def reset(self):
+        """New connection."""
+        self.last_rx = self.last_tx = now()
+        self._probe = None          # time of unanswered probe
+        self._idle = False          # the last message received was a pong
+
+    @property
+    def max_silence(self):
+        return 2 * self.interval if self._max_silence is None else self._max_silence
+
+    @max_silence.setter
+    def max_silence(self, seconds):
+        """None: default"""
+        self._max_silence = seconds
+
+    @property
+    def probe_after(self):
+        return self.interval / 2
+
+    @property
+    def timeout(self):
+        if self._srtt is None:
+            rto = self.interval / 2
+        else:
+            rto = self._srtt + 4 * self._rttvar
+        return min(max(rto, self.min_timeout), self.interval)
+
+    def received(self):
+        """Anything received proves the connection is alive."""
+        self.last_rx = now()
+        self._probe = None
+        self._idle = False
+
+    def sent(self):
+        """Anything sent tells the gateway we are alive."""
+        self.last_tx = now()
+
+    def ping_due(self):
+        """Seconds until the next ping is due, <= 0 if due now."""
+        silence = self.last_tx + self.max_silence - now()
+        if self._probe is not None:
+            # waiting for an answer
+            return min(self.timeout, silence)
+        if self._idle:
+            return silence
+        return min(self.last_rx + self.probe_after - now(), silence)
+
+    def ping(self):
+        """Record ping sent, returns timestamp to send with it."""
+        self._ping_ts = self._probe = now()
+        return self._ping_ts
+
+    def pong(self, ts=None):
+        """Record answer to ping, returns round trip time in seconds or None.
+        ts: timestamp of the ping echoed by the gateway, if any."""
+        sent = ts if isinstance(ts, (int, float)) else self._ping_ts
+        self._ping_ts = None
+        self._idle = True
+        if sent is None:
+            return None
+        rtt = now() - sent
+        if rtt < 0 or rtt > 10 * self.interval:
+            # not ours (e.g. from a previous session)
+            return None
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        return rtt
+
+    def recv_timeout(self):
+        """How long the receiver may wait for data before checking dead()."""
+        if self._probe is not None:
+            return max(self._probe + self.timeout - now(), 0.01)
+        return max(self.ping_due(), 0) + self.timeout
+
+    def dead(self):
+        """True if a probe went unanswered for longer than timeout, or if
+        nothing was received for much longer than expected (e.g. the probe
+        could not be sent)."""
+        if self._probe is not None and now() - self._probe > self.timeout:
+            return True
+        return now() - self.last_rx > self.max_silence + self.interval
@@ -2,15 +2,23 @@ import asyncio
 from pyscript import version_info
 from js import console
 
+import metrics
 from gateway import gateway_task
-from dom_manipulations import message
+from wasm_websocket import start_worker
+from dom_manipulations import message, metrics_task
 
 
-GATEWAY = 'ws://10.0.0.105/ws'     # s3 @ 440 Davis Router (TPA)
-GATEWAY = 'ws://10.0.0.176/ws'     # s3_prod @ 440 Davis Router (TPA - reliable)
-GATEWAY = 'ws://10.0.0.8/ws'       # pros3
+# candidates, connection attempts are made in parallel, first to answer wins
+GATEWAYS = [
+    'ws://rv-logger/ws',       # mdns
+    'ws://10.0.0.8/ws',        # pros3
+    'ws://10.0.0.176/ws',      # s3_prod @ 440 Davis Router (TPA - reliable)
+    'ws://10.0.0.105/ws',      # s3 @ 440 Davis Router (TPA)
+]
 
-GATEWAY = 'ws://rv-logger/ws'      # mdns
+# run websocket I/O and decoding in a Web Worker, if the page is
+# cross-origin isolated (required for SharedArrayBuffer)
+USE_WORKER = True
 
 
 """
@@ -32,11 +40,15 @@ GL.iNet R
 
 
 async def main_task():
-    console.log(f"gateway {GATEWAY}, pyscript {version_info}")
+    console.log(f"gateways {GATEWAYS}, pyscript {version_info}")
     message(f"PYSCRIPT version {version_info}")
 
+    if USE_WORKER and start_worker():
+        message("gateway communication in web worker")
+
     # start communication with gateway to get config and state updates
-    asyncio.create_task(gateway_task(GATEWAY))
+    asyncio.create_task(gateway_task(GATEWAYS))
+    asyncio.create_task(metrics_task())
 
 
 def global_exception_handler(loop, context):
@@ -51,6 +63,7 @@ def global_exception_handler(loop, context):
 def main():
     try:
         console.log("webapp.main starting ...")
+        metrics.phase("python ready")
         # set exception handler
         loop = asyncio.get_event_loop()
         loop.set_exception_handler(global_exception_handler)
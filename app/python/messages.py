@@ -0,0 +1,139 @@
+from collections import deque
+from datetime import datetime
+
+from dom import document, window, console, create_once_callable
+import proxies
+
+
+# Message log for the Messages page.
+#
+# Messages are kept in a bounded store (the oldest are dropped beyond _MAX)
+# and rendered virtually: only the rows in the visible part of the list
+# exist in the DOM, positioned in a spacer as tall as the whole (filtered)
+# list, newest first. Rows have a fixed height (_ROW_HEIGHT, see style.css).
+# Adding messages costs no DOM work while the page is hidden; when shown,
+# it is re-rendered at most once per animation frame.
+
+LEVELS = ('debug', 'info', 'warning', 'error')
+
+_MAX = 500
+_ROW_HEIGHT = 24        # px, .message-row in style.css
+_OVERSCAN = 5           # rows rendered above and below the visible ones
+
+# (seq, time, severity, text), oldest first
+_STORE = deque(maxlen=_MAX)
+_COUNT = 0              # messages ever added, numbers them
+_MIN_LEVEL = 1          # index in LEVELS, info (as selected in index.html)
+_FILTER = ''
+_FILTERED = None        # store filtered, newest first; None: out of date
+
+_VISIBLE = False
+_SCHEDULED = False
+_ROWS = []              # row elements, reused
+_LIST = None            # scrolling container
+_SPACER = None          # rows are positioned in here
+
+
+def add(text, severity=None):
+    """Add message; severity: one of LEVELS, default error for text
+    starting with ***** (as logged on failures), info otherwise."""
+    global _COUNT, _FILTERED
+    if severity not in LEVELS:
+        severity = 'error' if text.startswith('*****') else 'info'
+    _STORE.append((_COUNT, datetime.now().strftime("%H:%M:%S"), severity, text))
+    _COUNT += 1
+    _FILTERED = None
+    _request_render()
+
+
+def count():
+    return _COUNT
+
+
+def set_filter(min_level=None, text=None):
+    """Show messages with at least severity min_level containing text."""
+    global _MIN_LEVEL, _FILTER, _FILTERED
+    if min_level is not None:
+        _MIN_LEVEL = LEVELS.index(min_level) if min_level in LEVELS else 0
+    if text is not None:
+        _FILTER = text.lower()
+    _FILTERED = None
+    _request_render()
+
+
+def _filtered():
+    global _FILTERED
+    if _FILTERED is None:
+        _FILTERED = [
+            m for m in reversed(_STORE)
+            if LEVELS.index(m[2]) >= _MIN_LEVEL and (not _FILTER or _FILTER in m[3].lower())
+        ]
+    return _FILTERED
+
+
+def set_visible(visible):
+    """Messages page shown or hidden."""
+    global _VISIBLE
+    _VISIBLE = visible
+    if visible:
+        _request_render()
+
+
+def _request_render():
+    global _SCHEDULED
+    if not _VISIBLE or _SCHEDULED:
+        return
+    _SCHEDULED = True
+    try:
+        window.requestAnimationFrame(create_once_callable(_animation_frame))
+    except Exception as e:
+        console.log(f"***** messages render: {e}")
+        _SCHEDULED = False
+
+
+def _animation_frame(timestamp=None):
+    global _SCHEDULED
+    _SCHEDULED = False
+    try:
+        render()
+    except Exception as e:
+        console.log(f"***** messages render: {e}")
+
+
+def render():
+    """Render the rows in view."""
+    global _LIST
+    if _LIST is None:
+        _setup()
+    msgs = _filtered()
+    _SPACER.style.height = f"{len(msgs) * _ROW_HEIGHT}px"
+    top = int(_LIST.scrollTop)
+    height = _LIST.clientHeight or 20 * _ROW_HEIGHT
+    first = max(0, top // _ROW_HEIGHT - _OVERSCAN)
+    last = min(len(msgs), (top + height) // _ROW_HEIGHT + 1 + _OVERSCAN)
+    n = max(0, last - first)
+    while len(_ROWS) < n:
+        row = document.createElement('div')
+        _SPACER.appendChild(row)
+        _ROWS.append(row)
+    for i, row in enumerate(_ROWS):
+        if i >= n:
+            row.hidden = True
+            continue
+        seq, time, severity, text = msgs[first + i]
+        row.hidden = False
+        row.className = f"message-row message-{severity}"
+        row.style.top = f"{(first + i) * _ROW_HEIGHT}px"
+        row.innerText = f"[{seq:04d}] {time} {text}"
+        row.title = text
+
+
+def _setup():
+    global _LIST, _SPACER
+    _LIST = document.getElementById('messages-list')
+    _SPACER = document.getElementById('messages-spacer')
+    _LIST.onscroll = proxies.create(lambda event: _request_render())
+    level = document.getElementById('messages-level')
+    level.onchange = proxies.create(lambda event: set_filter(min_level=level.value))
+    text = document.getElementById('messages-filter')
+    text.oninput = proxies.create(lambda event: set_filter(text=text.value))
@@ -0,0 +1,173 @@
+import sys
+import time
+from collections import deque
+
+
+# Lightweight instrumentation: counters, histograms and timelines, looked up
+# by name. Recording is cheap (no allocations for counters and histograms);
+# report() formats everything for the metrics page.
+
+_METRICS = {}
+
+
+def now():
+    return time.perf_counter()
+
+
+# startup timeline: (phase, seconds since the page started loading)
+_PHASES = []
+_T0 = time.perf_counter()
+
+def _since_load():
+    if sys.platform == 'emscripten':
+        from js import performance
+        # ms since navigation start, includes loading pyscript & pyodide
+        return performance.now() / 1000
+    return time.perf_counter() - _T0
+
+
+def phase(name):
+    """Record the end of a startup phase (first occurrence only)."""
+    if not any(p == name for p, t in _PHASES):
+        _PHASES.append((name, _since_load()))
+
+
+def phases():
+    return list(_PHASES)
+
+
+class Counter:
+    """Event count with rate over the last minute (one bucket per second)."""
+
+    def __init__(self):
+        self.count = 0
+        self._buckets = deque(maxlen=60)    # [second, count]
+
+    def inc(self, n=1):
+        self.count += n
+        sec = int(now())
+        buckets = self._buckets
+        if buckets and buckets[-1][0] == sec:
+            buckets[-1][1] += n
+        else:
+            buckets.append([sec, n])
+
+    def rate(self, window=10):
+        """Events per second over the last window seconds."""
+        start = int(now()) - window
+        return sum(n for sec, n in self._buckets if sec >= start) / window
+
+    def report(self):
+        return f"{self.count:8d} total {self.rate():8.1f}/s"
+
+
+class Gauge:
+    """Current value of something, e.g. number of live objects, and its peak."""
+
+    def __init__(self):
+        self.value = 0
+        self.max = 0
+
+    def add(self, n=1):
+        self.value += n
+        if self.value > self.max:
+            self.max = self.value
+
+    def report(self):
+        return f"{self.value:8d} now {self.max:8d} max"
+
+
+# histogram bucket upper bounds [s]: 50us ... ~100s, factor 2
+_BOUNDS = tuple(50e-6 * 2**i for i in range(22))
+
+class Histogram:
+    """Distribution of durations (seconds), log2 buckets."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self._buckets = [0] * (len(_BOUNDS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if value < self.min: self.min = value
+        if value > self.max: self.max = value
+        i = 0
+        for bound in _BOUNDS:
+            if value <= bound:
+                break
+            i += 1
+        self._buckets[i] += 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Upper bound of the bucket containing the p-th percentile (0..100)."""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self._buckets):
+            seen += n
+            if seen >= target:
+                return min(_BOUNDS[i], self.max) if i < len(_BOUNDS) else self.max
+        return self.max
+
+    def report(self):
+        if not self.count:
+            return "       - "
+        ms = 1000
+        return f"{self.count:8d} x mean {self.mean*ms:8.2f} p90 {self.percentile(90)*ms:8.2f} max {self.max*ms:8.2f} ms"
+
+
+class Timeline:
+    """The last size (time, value) samples."""
+
+    def __init__(self, size=100):
+        self._samples = deque(maxlen=size)
+
+    def add(self, value, t=None):
+        self._samples.append((now() if t is None else t, value))
+
+    def samples(self):
+        return list(self._samples)
+
+    def report(self):
+        if not self._samples:
+            return "       - "
+        last = self._samples[-1]
+        return f"{len(self._samples):8d} samples, last {last[1]:.3f} ({now()-last[0]:.0f} s ago)"
+
+
+def _get(name, cls, *args):
+    m = _METRICS.get(name)
+    if m is None:
+        m = _METRICS[name] = cls(*args)
+    elif type(m) is not cls:
+        raise TypeError(f"metric {name!r} is a {type(m).__name__}, not a {cls.__name__}")
+    return m
+
+
+def counter(name):
+    return _get(name, Counter)
+
+def gauge(name):
+    return _get(name, Gauge)
+
+def histogram(name):
+    return _get(name, Histogram)
+
+def timeline(name, size=100):
+    return _get(name, Timeline, size)
+
+
+def report():
+    """Startup timeline and all metrics, one line each, sorted by name."""
+    lines = [ f"startup {name:20s} {t:8.3f} s" for name, t in _PHASES ]
+    lines += [ f"{name:28s} {m.report()}" for name, m in sorted(_METRICS.items()) ]
+    return "\n".join(lines)
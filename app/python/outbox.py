@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+from dom import console
+import metrics
+
+
+# Outbound message queue, kept across disconnects and replayed in order
+# after reconnecting.
+#
+# When full, the oldest messages are dropped (logged, and counted on the
+# metrics page). The config_chunk messages of one configuration are kept
+# or dropped as a set, the gateway cannot reassemble part of one; a new
+# set (seq 0) replaces any set still queued.
+
+# requests that make earlier queued copies redundant: only the latest is kept
+COALESCE = { 'state_get_all', 'config_get', 'rate_policy' }
+
+# stale once the connection is gone, never queued
+TRANSIENT = { 'ping', 'pong', 'codec_offer', 'session_resume' }
+
+_DROPPED = metrics.counter("outbox dropped")
+
+
+class Outbox:
+
+    def __init__(self, size=256):
+        self._size = size
+        self._queue = OrderedDict()     # key -> msg; config_chunk: ('chunk', set, seq)
+        self._seq = 0
+        self._set = None                # config_chunk set being queued
+        self._next_chunk = None         # seq expected next in it
+        self._set_dropped = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, msg):
+        tag = msg['tag']
+        if tag in TRANSIENT:
+            return
+        if tag == 'config_chunk':
+            key = self._chunk_key(msg)
+            if key is None:
+                self._drop(tag, 1)
+                return
+        elif tag in COALESCE:
+            # replaces (and moves to the end) a queued request with the same tag
+            key = tag
+            self._queue.pop(key, None)
+        else:
+            key = self._seq
+            self._seq += 1
+        self._queue[key] = msg
+        while len(self._queue) > self._size:
+            key, msg = self._queue.popitem(last=False)
+            n = 1
+            if isinstance(key, tuple):
+                n += self._remove_set(key[1])
+                if key[1] == self._set:
+                    self._set_dropped = True
+            self._drop(msg['tag'], n)
+
+    def _chunk_key(self, msg):
+        """Queue key of a config_chunk, None if the rest of its set was dropped."""
+        seq = msg.get('seq')
+        if seq == 0:
+            # new configuration, replaces any queued
+            for s in { k[1] for k in self._queue if isinstance(k, tuple) }:
+                self._remove_set(s)
+        if seq == 0 or seq != self._next_chunk:
+            self._set = self._seq
+            self._seq += 1
+            self._set_dropped = False
+        self._next_chunk = seq + 1 if isinstance(seq, int) else None
+        if self._set_dropped:
+            return None
+        return ('chunk', self._set, seq)
+
+    def _remove_set(self, s):
+        keys = [ k for k in self._queue if isinstance(k, tuple) and k[1] == s ]
+        for k in keys:
+            del self._queue[k]
+        return len(keys)
+
+    def _drop(self, tag, n):
+        self.dropped += n
+        _DROPPED.inc(n)
+        console.log(f"***** outbox full, dropped {n} {tag}")
+
+    def drain(self):
+        """All queued messages, oldest first; the queue is empty after."""
+        msgs = list(self._queue.values())
+        self._queue.clear()
+        self._set = self._next_chunk = None
+        self._set_dropped = False
+        return msgs
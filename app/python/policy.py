@@ -0,0 +1,179 @@
+import asyncio
+
+import dom_render
+import metrics
+from utilities import config
+
+
+# Display rate policies for fast changing entities, from the entity config:
+#
+#   max-rate: 2         at most 2 display updates per second; the last value
+#                       of a burst is shown when the interval is over
+#   deadband: 0.5       no update unless the value changed by more than 0.5
+#                       (numeric values) since the value shown
+#   window: 5           show the aggregate of the values received in each
+#   aggregate: max      5 s window: min, avg (default) or max
+#
+# State updates go through schedule() instead of dom_render.schedule.
+# Entities without a policy are passed straight on. The policies can also be
+# sent to the gateway (app config "gateway-rate-policy: true", see wire())
+# so it throttles at the source.
+#
+# The first value after a snapshot (new policy, or resync() when the state is
+# requested after a reconnect) is shown right away, also with a window.
+
+_KEYS = ('max-rate', 'deadband', 'window', 'aggregate')
+_AGGREGATES = {
+    'min': lambda n, total, lo, hi: lo,
+    'avg': lambda n, total, lo, hi: total / n,
+    'max': lambda n, total, lo, hi: hi,
+}
+
+# eid -> _Policy
+_POLICIES = {}
+
+_SUPPRESSED = metrics.counter("policy suppressed")
+
+
+class _Policy:
+
+    __slots__ = ('eid', 'spec', 'interval', 'deadband', 'window', 'aggregate',
+                 'shown', 'shown_at', 'held', 'timer', 'samples')
+
+    def __init__(self, eid, entity_config):
+        self.eid = eid
+        self.spec = _spec(entity_config)
+        rate = float(entity_config.get('max-rate') or 0)
+        self.interval = 1 / rate if rate > 0 else 0
+        self.deadband = float(entity_config.get('deadband') or 0)
+        self.window = float(entity_config.get('window') or 0)
+        self.aggregate = _AGGREGATES.get(entity_config.get('aggregate', 'avg'), _AGGREGATES['avg'])
+        self.shown = None           # last value passed on
+        self.shown_at = None
+        self.held = None            # (value,) waiting for the rate limit
+        self.timer = None
+        self.samples = None         # [n, total, min, max] of the current window
+
+    def submit(self, value):
+        if self.window and self.shown_at is not None:
+            self._collect(value)
+        else:
+            self._offer(value)
+
+    def _collect(self, value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            # not numeric, nothing to aggregate
+            self._offer(value)
+            return
+        s = self.samples
+        if s is None:
+            self.samples = [ 1, value, value, value ]
+            self.timer = asyncio.get_event_loop().call_later(self.window, self._window_end)
+        else:
+            s[0] += 1
+            s[1] += value
+            if value < s[2]: s[2] = value
+            if value > s[3]: s[3] = value
+            _SUPPRESSED.inc()
+
+    def _window_end(self):
+        s, self.samples, self.timer = self.samples, None, None
+        if s:
+            self._show(self.aggregate(*s))
+
+    def _offer(self, value):
+        if self.deadband and self.shown_at is not None:
+            try:
+                if abs(float(value) - float(self.shown)) <= self.deadband:
+                    self.held = None
+                    _SUPPRESSED.inc()
+                    return
+            except (TypeError, ValueError):
+                pass
+        if self.interval:
+            wait = self.shown_at + self.interval - metrics.now() if self.shown_at is not None else 0
+            if wait > 0:
+                # show the latest value when the interval is over
+                if self.held is not None:
+                    _SUPPRESSED.inc()
+                self.held = (value,)
+                if self.timer is None:
+                    self.timer = asyncio.get_event_loop().call_later(wait, self._release)
+                return
+        self._show(value)
+
+    def _release(self):
+        held, self.held, self.timer = self.held, None, None
+        if held is not None:
+            self._show(held[0])
+
+    def _show(self, value):
+        self.shown = value
+        self.shown_at = metrics.now()
+        dom_render.schedule(self.eid, value)
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def resync(self):
+        """Show the next value right away."""
+        self.cancel()
+        self.held = self.samples = None
+        self.shown_at = None
+
+    def wire(self):
+        """Policy as configured, for the gateway."""
+        entity_config = config.get_entity_config(self.eid)
+        return { k: entity_config[k] for k in _KEYS if k in entity_config }
+
+
+def _spec(entity_config):
+    return tuple(entity_config.get(k) for k in _KEYS)
+
+
+def configure():
+    """Set up policies for the entities in the configuration. Policies
+    (and their state) of entities whose settings did not change are kept."""
+    old = dict(_POLICIES)
+    _POLICIES.clear()
+    for view in config.get_views():
+        for eid in view.get('entities', []):
+            entity_config = config.get_entity_config(eid)
+            if eid in _POLICIES or not any(entity_config.get(k) for k in _KEYS[:3]):
+                continue
+            p = old.pop(eid, None)
+            if p is not None and p.spec == _spec(entity_config):
+                _POLICIES[eid] = p
+                continue
+            if p is not None:
+                p.cancel()
+            _POLICIES[eid] = _Policy(eid, entity_config)
+    for p in old.values():
+        p.cancel()
+
+
+def resync():
+    """A state snapshot was requested: show the first value of each entity
+    right away."""
+    for p in _POLICIES.values():
+        p.resync()
+
+
+def schedule(eid, value):
+    """dom_render.schedule, subject to the policy of eid."""
+    p = _POLICIES.get(eid)
+    if p is None:
+        dom_render.schedule(eid, value)
+    else:
+        p.submit(value)
+
+
+def wire():
+    """eid -> policy for the gateway, None if not enabled or no policies."""
+    if not config.get('app', 'gateway-rate-policy') or not _POLICIES:
+        return None
+    return { eid: p.wire() for eid, p in _POLICIES.items() }
@@ -0,0 +1,52 @@
+import sys
+
+import metrics
+
+if sys.platform == 'emscripten':
+    from pyodide.ffi import create_proxy
+else:
+    from headless import create_proxy
+
+
+# Ownership of JS proxies for Python callables (event handlers).
+#
+# A proxy keeps its Python function alive until it is destroyed, so handlers
+# of short-lived objects (sockets, views) leak unless freed. Create them
+# through the Proxies owned by the object and destroy() them with it.
+# Handlers that live as long as the app are created with create() (owned by
+# _APP). Assign handlers to JS only as proxies: assigning a Python function
+# directly creates a proxy nobody can free. Live proxies are on the metrics
+# page.
+
+_LIVE = metrics.gauge("js proxies")
+
+
+class Proxies:
+
+    def __init__(self):
+        self._proxies = []
+
+    def __len__(self):
+        return len(self._proxies)
+
+    def create(self, fn):
+        """Proxy for fn, destroyed by destroy()."""
+        proxy = create_proxy(fn)
+        self._proxies.append(proxy)
+        _LIVE.add()
+        return proxy
+
+    def destroy(self):
+        """Destroy all proxies created so far; they must not be called after."""
+        proxies, self._proxies = self._proxies, []
+        for proxy in proxies:
+            proxy.destroy()
+        _LIVE.add(-len(proxies))
+
+
+_APP = Proxies()
+
+
+def create(fn):
+    """Proxy for the lifetime of the app."""
+    return _APP.create(fn)
@@ -0,0 +1,91 @@
+import asyncio
+import random
+from dom import console
+
+from wasm_websocket import connect
+import storage
+
+
+# Reconnect strategy: exponential backoff with jitter between rounds, and
+# parallel connection attempts to all candidate gateway urls in each round.
+# The first url that answers is used and remembered for the next startup.
+
+_LAST_GOOD_KEY = 'gateway'
+
+
+class Backoff:
+    """Exponential backoff: delay = base * factor**attempt, capped at cap,
+    reduced by a random fraction (up to jitter) to spread out clients."""
+
+    def __init__(self, base=0.5, factor=2, cap=30, jitter=0.5):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.attempt = 0
+
+    def reset(self):
+        self.attempt = 0
+
+    def next(self):
+        """Delay (seconds) before the next attempt."""
+        delay = min(self.cap, self.base * self.factor ** self.attempt)
+        self.attempt += 1
+        return delay * (1 - self.jitter * random.random())
+
+
+def load_last_good():
+    return storage.load(_LAST_GOOD_KEY)
+
+
+def save_last_good(url):
+    storage.save(_LAST_GOOD_KEY, url)
+
+
+def candidates(urls):
+    """urls with the last good one first."""
+    last = load_last_good()
+    if last in urls:
+        return [ last ] + [ url for url in urls if url != last ]
+    return list(urls)
+
+
+async def _open(url, timeout):
+    ws = await connect(url)
+    try:
+        await ws.wait_open(timeout)
+    except BaseException:
+        await _close(ws)
+        raise
+    return url, ws
+
+
+async def _close(ws):
+    try:
+        await ws.close()
+    except Exception:
+        pass
+
+
+async def connect_first(urls, timeout=10):
+    """Connect to all urls in parallel, returns (url, socket) of the first
+    that opens, closes the others. Raises ConnectionError if none does."""
+    pending = { asyncio.ensure_future(_open(url, timeout)) for url in urls }
+    result = None
+    try:
+        while pending and result is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    console.log(f"connect: {task.exception()}")
+                elif result is None:
+                    result = task.result()
+                else:
+                    # opened at the same time
+                    await _close(task.result()[1])
+    finally:
+        for task in pending:
+            task.cancel()
+    if result is None:
+        raise ConnectionError(f"no gateway answered: {', '.join(urls)}")
+    return result
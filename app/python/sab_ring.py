@@ -0,0 +1,66 @@
+import struct
+import js
+from pyodide.ffi import to_js
+
+
+class SabRing:
+    """Single producer, single consumer ring of frames in a SharedArrayBuffer.
+
+    Used to pass messages from the worker (writer) to the UI thread (reader)
+    without copying them through postMessage. Layout: two Int32 (write and
+    read offset), followed by the data area. Each frame is a 4 byte length
+    (little endian) and the payload, wrapping around the end of the data area.
+    Offsets are published with Atomics so each side sees complete frames.
+    """
+
+    HEADER = 8
+
+    def __init__(self, sab):
+        self.sab = sab
+        self._offsets = js.Int32Array.new(sab, 0, 2)
+        self._data = js.Uint8Array.new(sab, self.HEADER)
+        self._size = self._data.length
+        self.dropped = 0
+
+    @classmethod
+    def create(cls, capacity=1 << 20):
+        return cls(js.SharedArrayBuffer.new(cls.HEADER + capacity))
+
+    def _used(self, w, r):
+        return (w - r) % self._size
+
+    def write(self, payload):
+        """Append frame, returns False (frame dropped) if the ring is full."""
+        frame = struct.pack('<I', len(payload)) + payload
+        n = len(frame)
+        w = js.Atomics.load(self._offsets, 0)
+        r = js.Atomics.load(self._offsets, 1)
+        if n > self._size - 1 - self._used(w, r):
+            self.dropped += 1
+            return False
+        first = min(n, self._size - w)
+        self._data.set(to_js(frame[:first]), w)
+        if first < n:
+            self._data.set(to_js(frame[first:]), 0)
+        js.Atomics.store(self._offsets, 0, (w + n) % self._size)
+        return True
+
+    def read_all(self):
+        """All frames written since the last call (list of bytes)."""
+        w = js.Atomics.load(self._offsets, 0)
+        r = js.Atomics.load(self._offsets, 1)
+        if w == r:
+            return []
+        # copy everything out in (at most) two slices, then parse in Python
+        if w > r:
+            data = self._data.slice(r, w).to_bytes()
+        else:
+            data = self._data.slice(r).to_bytes() + self._data.slice(0, w).to_bytes()
+        js.Atomics.store(self._offsets, 1, w)
+        frames = []
+        i = 0
+        while i < len(data):
+            n, = struct.unpack_from('<I', data, i)
+            frames.append(data[i+4:i+4+n])
+            i += 4 + n
+        return frames
@@ -0,0 +1,44 @@
+import json
+import os
+
+from dom import console
+from wasm_websocket import iswasm
+
+
+# Small persistent key/value store for JSON-serializable values.
+# localStorage in the browser, one file per key when running natively.
+
+_PREFIX = 'rv-webapp-'
+_DIR = os.path.expanduser('~/.rv-webapp')
+
+
+def load(key, default=None):
+    try:
+        if iswasm():
+            from js import localStorage
+            value = localStorage.getItem(_PREFIX + key)
+            return default if value is None else json.loads(value)
+        with open(os.path.join(_DIR, key + '.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        console.log(f"***** storage.load {key}: {e}")
+        return default
+
+
+def save(key, value):
+    try:
+        data = json.dumps(value, default=str)
+        if iswasm():
+            from js import localStorage
+            localStorage.setItem(_PREFIX + key, data)
+        else:
+            os.makedirs(_DIR, exist_ok=True)
+            path = os.path.join(_DIR, key + '.json')
+            with open(path + '.tmp', 'w') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+    except Exception as e:
+        # e.g. quota exceeded, the cache is an optimization only
+        console.log(f"***** storage.save {key}: {e}")
@@ -1,7 +1,10 @@
 # https://github.com/SubstructureOne/wasmsockets/tree/main
 
+import logging
 import sys
-from asyncio import Queue, Event
+import struct
+from asyncio import Event, wait_for, wait, ensure_future, get_event_loop, FIRST_COMPLETED, TimeoutError
+from collections import deque
 from typing import Any, Callable, Optional
 from dataclasses import dataclass
 
@@ -12,21 +15,44 @@ def iswasm():
     return sys.platform == 'emscripten'
 
 
+def _log(text):
+    # also runs in the worker, which has no dom module
+    if iswasm():
+        js.console.log(text)
+    else:
+        logging.getLogger('webapp').info(text)
+
+
 if iswasm():
     # These packages are only available in a Pyodide environment. They never
     # need to be installed separately. We will only reference them when we
     # detect we are running in WebAssembly.
     import js
     import pyodide.ffi
+    import proxies
 else:
     import websockets
 
 
-async def connect(uri):
-    socket = _WasmSocket(uri)
-    await socket.connect()
+# receive buffer overflow policies
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+
 
+def _is_state(frame):
+    """Frame (text or binary, not decoded) is a state update or batch, the
+    only messages dropped when the receive buffer is full. The tag is sent
+    as a plain string by both codecs."""
+    return ('state_update' if isinstance(frame, str) else b'state_update') in frame
 
+
+async def connect(uri, buffer_size=1024, policy=DROP_OLDEST):
+    """Socket for uri. In the browser the connection is not open yet when
+    this returns, see wait_open."""
+    # socket in the worker if start_worker was called
+    cls = _WorkerSocket if SAB_PROXY is not None else _WasmSocket
+    socket = cls(uri, buffer_size, policy)
+    await socket.connect()
     return socket
 
 
@@ -42,9 +68,124 @@ def use_sab_proxy(send, recv):
     SAB_PROXY = SabProxy(send, recv)
 
 
+# Worker mode: websocket I/O, decoding and state coalescing run in a Web
+# Worker (worker.py), which passes the results through a SharedArrayBuffer
+# ring (sab_ring.py). SAB_PROXY.send posts commands to the worker,
+# SAB_PROXY.recv reads all frames from the ring.
+
+_WORKER = None
+_WORKER_SOCKETS = {}    # socket id -> _WorkerSocket
+
+
+def start_worker(script='worker.js', ring_size=1 << 20):
+    """Move websocket I/O to a Web Worker. Returns False if not possible:
+    SharedArrayBuffer requires the page to be cross-origin isolated
+    (served with COOP/COEP headers)."""
+    global _WORKER
+    if not iswasm() or not getattr(js, 'crossOriginIsolated', False):
+        return False
+    from sab_ring import SabRing
+    ring = SabRing.create(ring_size)
+    _WORKER = js.Worker.new(script)
+    _WORKER.onmessage = proxies.create(_worker_event)
+
+    def send(command):
+        _WORKER.postMessage(pyodide.ffi.to_js(command, dict_converter=js.Object.fromEntries))
+
+    use_sab_proxy(send, ring.read_all)
+    send({ 'cmd': 'init', 'sab': ring.sab })
+    return True
+
+
+def _worker_event(event):
+    data = event.data
+    name = data.event
+    if name == 'data':
+        for frame in SAB_PROXY.recv():
+            sid, = struct.unpack_from('<I', frame)
+            socket = _WORKER_SOCKETS.get(sid)
+            if socket is not None:
+                socket._incoming.put(frame[4:].decode())
+        return
+    socket = _WORKER_SOCKETS.get(data.sid)
+    if socket is None:
+        return
+    if name == 'open':
+        socket._isopen.set()
+    elif name == 'close':
+        socket._isopen.clear()
+        socket._closed.set()
+        _WORKER_SOCKETS.pop(data.sid, None)
+
+
+class _RingBuffer:
+    """Bounded receive buffer.
+
+    Filled synchronously from the JS message callback (no task per message).
+    When full, either the oldest or the newest droppable message is dropped
+    (all are if droppable is None). Others are kept beyond size, and logged.
+    """
+
+    def __init__(self, size, policy=DROP_OLDEST, droppable=None):
+        self._items = deque()
+        self._size = size
+        self._policy = policy
+        self._droppable = droppable
+        self._ready = Event()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        if len(self._items) >= self._size and not self._drop(item):
+            return
+        self._items.append(item)
+        self._ready.set()
+
+    def _drop(self, item):
+        """Make room for item, False if item itself was dropped."""
+        droppable = self._droppable
+        if self._policy == DROP_NEWEST:
+            if droppable is None or droppable(item):
+                self.dropped += 1
+                return False
+        elif droppable is None:
+            self._items.popleft()
+            self.dropped += 1
+            return True
+        else:
+            for i, old in enumerate(self._items):
+                if droppable(old):
+                    del self._items[i]
+                    self.dropped += 1
+                    return True
+        _log(f"***** receive buffer full ({len(self._items)}), message kept")
+        return True
+
+    async def _wait(self, timeout):
+        while not self._items:
+            self._ready.clear()
+            if timeout is None:
+                await self._ready.wait()
+            else:
+                # only allocates a timer if there is nothing to read
+                await wait_for(self._ready.wait(), timeout)
+
+    async def get(self, timeout=None):
+        await self._wait(timeout)
+        return self._items.popleft()
+
+    async def get_many(self, timeout=None):
+        """All messages received so far, waits if there are none."""
+        await self._wait(timeout)
+        items = list(self._items)
+        self._items.clear()
+        return items
+
+
 class _WasmSocket:
-    def __init__(self, uri):
-        from js import console
+    def __init__(self, uri, buffer_size=1024, policy=DROP_OLDEST):
         self._uri = uri
         # _jssocket or _pysockets only gets initialized when calling connect().
         # _jssocket will be initialized in a WebAssembly environment; _pysocket
@@ -53,15 +194,45 @@ class _WasmSocket:
         self._pysocket = None
         self._message_handlers = list()
         if iswasm():
-            self._incoming = Queue()
+            self._incoming = _RingBuffer(buffer_size, policy, _is_state)
             self._isopen = Event()
+            self._closed = Event()
+            # event handlers, destroyed when the socket is closed
+            self._proxies = proxies.Proxies()
         else:
             self._incoming = None
             self._isopen = None
+            self._closed = None
+            self._proxies = None
 
     @property
     def connected(self):
-        return self._isopen.is_set()
+        if iswasm():
+            return self._isopen.is_set()
+        return self._pysocket is not None and self._pysocket.close_code is None
+
+    @property
+    def closed(self):
+        if iswasm():
+            return self._closed.is_set()
+        return self._pysocket is not None and self._pysocket.close_code is not None
+
+    async def wait_open(self, timeout):
+        """Wait until the connection is open. Raises ConnectionError if it
+        was closed (refused, unreachable) or TimeoutError."""
+        if not iswasm() or self._isopen.is_set():
+            return
+        waiters = [ ensure_future(self._isopen.wait()), ensure_future(self._closed.wait()) ]
+        try:
+            await wait(waiters, timeout=timeout, return_when=FIRST_COMPLETED)
+        finally:
+            for w in waiters:
+                w.cancel()
+        if self._isopen.is_set():
+            return
+        if self._closed.is_set():
+            raise ConnectionError(f"{self._uri} closed")
+        raise TimeoutError(f"{self._uri} not open after {timeout}s")
 
     async def connect(self):
         if iswasm():
@@ -74,19 +245,19 @@ class _WasmSocket:
             socket.binaryType = "arraybuffer"
             socket.addEventListener(
                 'open',
-                pyodide.ffi.create_proxy(self._open_handler)
+                self._proxies.create(self._open_handler)
             )
             socket.addEventListener(
                 'close',
-                pyodide.ffi.create_proxy(self._close_handler)
+                self._proxies.create(self._close_handler)
             )
             socket.addEventListener(
                 'message',
-                pyodide.ffi.create_proxy(self._message_handler)
+                self._proxies.create(self._message_handler)
             )
             socket.addEventListener(
                 'error',
-                pyodide.ffi.create_proxy(self._error_handler)
+                self._proxies.create(self._error_handler)
             )
             self._jssocket = socket
         else:
@@ -123,7 +294,7 @@ class _WasmSocket:
             data = pyodide.ffi.to_js(message)
         else:
             data = message
-            SAB_PROXY.send(data)
+        SAB_PROXY.send(data)
 
     async def recv(self):
         if iswasm():
@@ -136,6 +307,21 @@ class _WasmSocket:
             result = await self._pysocket.recv()
         return result
 
+    async def recv_many(self, timeout=None):
+        """List of all messages already received, waits (at most timeout
+        seconds, then raises asyncio.TimeoutError) if there are none."""
+        if iswasm():
+            if not self._isopen.is_set():
+                await wait_for(self._isopen.wait(), timeout)
+            return await self._incoming.get_many(timeout)
+        else:
+            return [ await wait_for(self._pysocket.recv(), timeout) ]
+
+    @property
+    def dropped(self):
+        """Number of messages dropped because the receive buffer was full."""
+        return self._incoming.dropped if self._incoming else 0
+
     def recv_sync(self):
         if SAB_PROXY is None:
             raise NotImplementedError("Sync methods only supported when using the SharedArrayBuffer proxy")
@@ -165,11 +351,49 @@ class _WasmSocket:
     async def _close_handler(self, event):
         js.console.log(f"WS: Close event:", event)
         self._isopen.clear()
+        self._closed.set()
+        # the last event of a socket, free the handlers (not from within one)
+        get_event_loop().call_soon(self._proxies.destroy)
 
-    async def _message_handler(self, event):
+    def _message_handler(self, event):
+        # synchronous: called from JS, no asyncio task per message
         # js.console.log(f"WS: Message event:", event)
-        await self._incoming.put(event.data)
+        data = event.data
+        if not isinstance(data, str):
+            # binary frame (ArrayBuffer), copied once into bytes
+            data = data.to_bytes()
+        self._incoming.put(data)
 
     async def _error_handler(self, event):
         js.console.log(f"WS: Error event:", event)
- 
\ No newline at end of file
+
+
+class _WorkerSocket(_WasmSocket):
+    """Websocket in the worker, same interface as _WasmSocket.
+    Receives decoded, coalesced messages as JSON text (see worker.py)."""
+
+    _next_sid = 0
+
+    def __init__(self, uri, buffer_size=1024, policy=DROP_OLDEST):
+        super().__init__(uri, buffer_size, policy)
+        _WorkerSocket._next_sid += 1
+        self._sid = _WorkerSocket._next_sid
+        _WORKER_SOCKETS[self._sid] = self
+
+    async def connect(self):
+        """Ask the worker to connect. Like _WasmSocket.connect in the
+        browser, does not wait for the connection: use wait_open."""
+        SAB_PROXY.send({ 'cmd': 'connect', 'sid': self._sid, 'uri': self._uri })
+
+    async def send(self, message):
+        await self._isopen.wait()
+        self.send_sync(message)
+
+    def send_sync(self, message):
+        if isinstance(message, BytesLike):
+            message = pyodide.ffi.to_js(message)
+        SAB_PROXY.send({ 'cmd': 'send', 'sid': self._sid, 'data': message })
+
+    async def close(self):
+        self._isopen.clear()
+        SAB_PROXY.send({ 'cmd': 'close', 'sid': self._sid })
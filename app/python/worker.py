@@ -0,0 +1,185 @@
+import asyncio
+import json
+import struct
+from collections import deque
+import js
+from pyodide.ffi import to_js
+
+from wasm_websocket import _WasmSocket
+from sab_ring import SabRing
+import codec
+import proxies
+
+
+# Runs in a Web Worker with its own Pyodide (see worker.js).
+#
+# Owns the gateway websockets: receives and decodes messages and coalesces
+# state updates (latest value per entity), then hands them to the UI thread
+# through a SharedArrayBuffer ring as JSON frames, one state_update_batch
+# per tick. The UI thread (wasm_websocket._WorkerSocket) only dispatches
+# what arrives and writes the DOM.
+#
+# UI -> worker: postMessage commands
+#     { cmd: 'init', sab }, { cmd: 'connect', sid, uri },
+#     { cmd: 'send', sid, data }, { cmd: 'close', sid }
+# worker -> UI: postMessage events { event: 'open' | 'close' | 'data', sid }
+#     'data': frames are waiting in the ring; one per tick for state
+#     batches, other messages (pong, config_put, ...) are notified at once.
+# Ring frames: socket id (uint32 little endian) + JSON message.
+#
+# Nothing is dropped when the ring is full: messages wait in order until
+# the UI thread has read enough, state updates meanwhile keep coalescing.
+
+_TICK = 0.05        # seconds between state batches
+
+_RING = None
+_CONNECTIONS = {}   # sid -> _Connection
+
+
+def _post(event, sid=None):
+    js.postMessage(to_js({ 'event': event, 'sid': sid }, dict_converter=js.Object.fromEntries))
+
+
+def _write(sid, msg):
+    """Write msg to the ring, False if there is no room."""
+    return _RING.write(struct.pack('<I', sid) + json.dumps(msg).encode())
+
+
+class _Connection:
+
+    def __init__(self, sid, uri):
+        self._sid = sid
+        self._ws = _WasmSocket(uri)
+        self._codec = codec.JsonCodec()
+        self._states = {}       # eid -> latest value, not yet passed on
+        self._version = None
+        self._out = deque()     # messages waiting for room in the ring
+        self._full = False
+
+    async def run(self):
+        try:
+            try:
+                await self._ws.connect()
+                await self._ws.wait_open(None)
+            except Exception as e:
+                js.console.log(f"***** worker connect: {e}")
+                return
+            _post('open', self._sid)
+            flush = asyncio.ensure_future(self._flush_task())
+            try:
+                while not self._ws.closed:
+                    try:
+                        msgs = await self._ws.recv_many(timeout=1)
+                    except asyncio.TimeoutError:
+                        continue
+                    for msg in msgs:
+                        self._recv(msg)
+            finally:
+                flush.cancel()
+        finally:
+            _CONNECTIONS.pop(self._sid, None)
+            _post('close', self._sid)
+
+    def _recv(self, data):
+        try:
+            msg = codec.decode(data, self._codec)
+        except Exception as e:
+            js.console.log(f"***** worker decode: {e}")
+            return
+        tag = msg.get('tag')
+        if tag == 'state_update':
+            self._update(((msg.get('eid'), msg.get('value')),), msg.get('version'))
+            return
+        if tag == 'state_update_batch':
+            self._update(msg.get('updates', ()), msg.get('version'))
+            return
+        if tag == 'codec':
+            # binary frames are decoded here
+            self._codec = codec.select(msg.get('name'))
+        # keep the order of other messages relative to state updates
+        self._queue_states()
+        self._out.append(msg)
+        self._drain()
+
+    def _update(self, updates, version):
+        for eid, value in updates:
+            self._states[eid] = value
+        if version is not None:
+            self._version = version
+
+    def _queue_states(self):
+        if not self._states:
+            return
+        last = self._out[-1] if self._out else None
+        if last is not None and last['tag'] == 'state_update_batch':
+            # still waiting for room in the ring, coalesce with it
+            last['updates'].update(self._states)
+        else:
+            last = { 'tag': 'state_update_batch', 'updates': self._states }
+            self._out.append(last)
+        if self._version is not None:
+            last['version'] = self._version
+        self._states = {}
+
+    def _drain(self):
+        """Write waiting messages to the ring in order, until it is full."""
+        written = False
+        while self._out:
+            msg = self._out[0]
+            if msg['tag'] == 'state_update_batch':
+                msg = dict(msg, updates=list(msg['updates'].items()))
+            if not _write(self._sid, msg):
+                if not self._full:
+                    js.console.log(f"***** worker: ring full, holding {len(self._out)} messages")
+                self._full = True
+                break
+            self._out.popleft()
+            written = True
+            self._full = False
+        if written:
+            _post('data', self._sid)
+
+    async def _flush_task(self):
+        while True:
+            await asyncio.sleep(_TICK)
+            self._queue_states()
+            self._drain()
+
+    async def send(self, data):
+        await self._ws.send(data)
+
+    async def close(self):
+        await self._ws.close()
+
+
+async def _command(cmd):
+    global _RING
+    try:
+        name = cmd.cmd
+        if name == 'init':
+            _RING = SabRing(cmd.sab)
+        elif name == 'connect':
+            c = _CONNECTIONS[cmd.sid] = _Connection(cmd.sid, cmd.uri)
+            asyncio.ensure_future(c.run())
+        elif name == 'send':
+            c = _CONNECTIONS.get(cmd.sid)
+            data = cmd.data
+            if not isinstance(data, str):
+                data = data.to_bytes()
+            if c: await c.send(data)
+        elif name == 'close':
+            c = _CONNECTIONS.get(cmd.sid)
+            if c: await c.close()
+    except Exception as e:
+        js.console.log(f"***** worker command: {e}")
+
+
+def _on_message(event):
+    asyncio.ensure_future(_command(event.data))
+
+
+def main(queued):
+    """Called by worker.js once Pyodide is up, with the commands received so far."""
+    js.self.onmessage = proxies.create(_on_message)
+    for cmd in queued:
+        asyncio.ensure_future(_command(cmd))
@@ -0,0 +1,40 @@
+// Web Worker running the gateway websockets (python/worker.py) with its own Pyodide.
+// Started by wasm_websocket.start_worker() on the UI thread.
+
+importScripts("https://cdn.jsdelivr.net/pyodide/v0.21.2/full/pyodide.js");
+
+// set to the zip of precompiled modules by tools/bundle.py
+const BUNDLE = null;
+
+const FILES = [
+  "python/worker.py",
+  "python/wasm_websocket.py",
+  "python/sab_ring.py",
+  "python/codec.py",
+  "python/metrics.py",
+  "python/proxies.py",
+];
+
+// commands received while Pyodide is loading
+const queued = [];
+self.onmessage = (event) => queued.push(event.data);
+
+async function start() {
+  const pyodide = await loadPyodide();
+  if (BUNDLE) {
+    const response = await fetch(BUNDLE);
+    pyodide.FS.writeFile(BUNDLE, new Uint8Array(await response.arrayBuffer()));
+    pyodide.runPython(`import sys; sys.path.insert(0, '${BUNDLE}')`);
+  } else {
+    pyodide.FS.mkdir("python");
+    for (const file of FILES) {
+      const response = await fetch(file);
+      pyodide.FS.writeFile(file, await response.text());
+    }
+    pyodide.runPython("import sys; sys.path.append('python')");
+  }
+  // worker.main replaces self.onmessage
+  pyodide.pyimport("worker").main(queued);
+}
+
+start();
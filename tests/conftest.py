@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the app modules run under CPython on the headless DOM (app/python/dom.py),
+# with the utilities stand-in if the real package is not installed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'python'))
+
+import headless
+import storage
+# never touch the cache of a real installation
+storage._DIR = tempfile.mkdtemp(prefix='rv-test-')
+
+import history
+import dom_manipulations
+from utilities import config
+
+
+@pytest.fixture
+def dom():
+    """Fresh document, no views; returns headless.document."""
+    headless.load()
+    history.reset()
+    dom_manipulations.reset()
+    config.set({})
+    yield headless.document
+    dom_manipulations.reset()
+
+
+@pytest.fixture
+def configure():
+    """configure(entities, app=None): configuration with one view showing
+    entities (eid -> entity config); the modules' own configure() is up to
+    the caller."""
+    def set_config(entities, app=None):
+        config.set({ 'app': app or {}, 'views': [ { 'icon': 'x', 'entities': list(entities) } ], 'entities': entities })
+    yield set_config
+    config.set({})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """metrics.now() under test control: clock[0] is the time in seconds."""
+    import metrics
+    import keepalive
+    t = [ 1000.0 ]
+    monkeypatch.setattr(metrics, 'now', lambda: t[0])
+    monkeypatch.setattr(keepalive, 'now', lambda: t[0])
+    return t
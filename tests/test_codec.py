@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import codec
+
+
+def _pack(enc, msg):
+    # as sent by the gateway: no envelope
+    buf = bytearray()
+    enc._pack(msg, buf)
+    return bytes(buf)
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 127, -1, -32, -33, 255, 65535, 2**32, -2**40,
+    1.5, '', 'x' * 31, 'x' * 300, b'\x00\x01', [ 1, [ 2, 'a' ] ], list(range(20)),
+    { 'k': { 'n': [ 1.25 ] } }, { str(i): i for i in range(20) },
+])
+def test_round_trip(value):
+    enc, dec = codec.PackCodec(), codec.PackCodec()
+    msg = { 'tag': 'x', 'value': value }
+    assert dec.decode(enc.encode(msg)) == { 'data': msg }
+
+
+def test_interned_strings_sent_once():
+    enc, dec = codec.PackCodec(), codec.PackCodec()
+    msg = { 'tag': 'state_update', 'eid': 'sensor.battery_voltage', 'value': 12.5 }
+    first, second = _pack(enc, msg), _pack(enc, msg)
+    assert b'sensor.battery_voltage' in first
+    assert b'sensor.battery_voltage' not in second
+    assert len(second) < len(first)
+    assert dec.decode(first) == msg
+    assert dec.decode(second) == msg
+
+
+def test_batch_eids_interned():
+    enc, dec = codec.PackCodec(), codec.PackCodec()
+    msg = { 'tag': 'state_update_batch', 'updates': [ [ f"sensor.e{i}", i ] for i in range(300) ], 'version': 7 }
+    first, second = _pack(enc, msg), _pack(enc, msg)
+    assert b'sensor.e299' in first
+    assert b'sensor.e' not in second
+    assert dec.decode(first) == msg
+    assert dec.decode(second) == msg
+
+
+def test_only_eid_values_interned():
+    enc = codec.PackCodec()
+    msg = { 'tag': 'info', 'msg': 'hello' }
+    _pack(enc, msg)
+    assert b'hello' in _pack(enc, msg)
+
+
+def test_decode_by_frame_type():
+    msg = { 'tag': 'pong' }
+    assert codec.decode(json.dumps(msg), codec.PackCodec()) == msg
+    assert codec.decode(_pack(codec.PackCodec(), msg), codec.PackCodec()) == msg
+
+
+def test_select():
+    assert isinstance(codec.select('msgpack'), codec.PackCodec)
+    assert isinstance(codec.select('unknown'), codec.JsonCodec)
+    assert codec.offer()[0] == 'msgpack'
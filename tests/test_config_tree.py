@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import config_tree
+
+
+CFG = {
+    'app': { 'ping-interval': 5 },
+    'views': [ { 'icon': 'a', 'entities': [ 'sensor.a' ] }, { 'icon': 'b', 'entities': [ 'sensor.b' ] } ],
+    'entities': { 'sensor.a': { 'name': 'A' }, 'sensor.b': { 'name': 'B' } },
+}
+
+
+def test_put_copies_along_path_only():
+    new = config_tree.put(CFG, [ 'views', 1, 'icon' ], 'c')
+    assert new['views'][1]['icon'] == 'c'
+    assert CFG['views'][1]['icon'] == 'b'
+    assert new['views'][0] is CFG['views'][0]
+    assert new['entities'] is CFG['entities']
+
+
+def test_put_appends_to_list():
+    new = config_tree.put(CFG, [ 'views', 2 ], { 'icon': 'c' })
+    assert len(new['views']) == 3
+
+
+def test_patch():
+    new = config_tree.patch(CFG, [ 'entities', 'sensor.a' ], { 'name': None, 'icon': 'x' })
+    assert new['entities']['sensor.a'] == { 'icon': 'x' }
+
+
+def test_affected_views():
+    assert config_tree.affected_views(CFG, [ 'views', 1, 'icon' ]) == { 1 }
+    assert config_tree.affected_views(CFG, [ 'entities', 'sensor.b', 'name' ]) == { 1 }
+    assert config_tree.affected_views(CFG, [ 'app' ]) is None
+
+
+def test_valid():
+    assert config_tree.validate(CFG) == []
+
+
+@pytest.mark.parametrize('cfg', [
+    {},
+    { 'app': None, 'views': None, 'entities': None },
+    { 'views': [ { 'icon': 'a', 'entities': None } ], 'entities': { 'sensor.a': None } },
+])
+def test_empty_sections_valid(cfg):
+    assert config_tree.validate(cfg) == []
+
+
+@pytest.mark.parametrize('path, value', [
+    ([ 'app' ], 3),
+    ([ 'app', 'ping-interval' ], 'fast'),
+    ([ 'views' ], { 'icon': 'a' }),
+    ([ 'views', 0, 'entities', 0 ], 7),
+    ([ 'entities', 'sensor.a', 'history' ], 'yes'),
+    ([ 'entities', 'sensor.a', 'aggregate' ], 'median'),
+])
+def test_invalid(path, value):
+    errors = config_tree.validate(config_tree.put(CFG, path, value))
+    assert len(errors) == 1
+    assert errors[0].startswith(path[0])
+
+
+def test_chunks():
+    cfg = { 'entities': { f"sensor.e{i}": { 'name': 'x' * 50 } for i in range(200) } }
+    chunks = config_tree.chunks(cfg, size=1000)
+    assert len(chunks) > 1
+    assert all(c['count'] == len(chunks) for c in chunks)
+    assert [ c['seq'] for c in chunks ] == list(range(len(chunks)))
+    assert json.loads("".join(c['data'] for c in chunks)) == cfg
@@ -0,0 +1,62 @@
+import pytest
+
+import dom_manipulations
+import dom_render
+import formats
+
+
+@pytest.mark.parametrize('value, text', [
+    (12.345, '12.3'), (7, '7'), ('on', 'on'), (None, 'None'),
+])
+def test_default(value, text):
+    assert formats.default(value) == (text, None)
+
+
+def test_unit_precision():
+    f = formats.make_formatter({ 'unit': 'V', 'precision': 2 })
+    assert f(12.6) == ('12.60 V', None)
+    assert f('n/a') == ('n/a V', None)
+
+
+def test_enum():
+    f = formats.make_formatter({ 'enum': { 0: 'Off', 1: 'On', 'true': 'Yes' } })
+    assert f(1)[0] == 'On'
+    assert f(True)[0] == 'On'       # True == 1
+    assert f(2)[0] == '2'
+    f = formats.make_formatter({ 'enum': { '0': 'Off', 'true': 'Yes' } })
+    assert f(0)[0] == 'Off'
+    assert f(True)[0] == 'Yes'
+    assert f([ 1 ])[0] == '[1]'
+
+
+def test_thresholds_first_match():
+    f = formats.make_formatter({ 'thresholds': [
+        { 'below': 10, 'class': 'alarm' },
+        { 'below': 20, 'class': 'warn' },
+        { 'above': 90, 'class': 'warn' },
+    ] })
+    assert [ f(v)[1] for v in (5, 15, 50, 95, 'x', True) ] == [ 'alarm', 'warn', '', 'warn', '', '' ]
+
+
+def test_configure_reports_changes(configure):
+    configure({ 'sensor.a': { 'unit': 'V' }, 'sensor.b': {} })
+    assert formats.configure([ 'sensor.a', 'sensor.b' ]) >= { 'sensor.a' }
+    assert formats.configure([ 'sensor.a', 'sensor.b' ]) == set()
+    configure({ 'sensor.a': {}, 'sensor.b': { 'precision': 1 } })
+    assert formats.configure([ 'sensor.a', 'sensor.b' ]) == { 'sensor.a', 'sensor.b' }
+    assert formats.formatter('sensor.a') is formats.default
+
+
+def test_class_reset_when_thresholds_removed(dom, configure):
+    configure({ 'sensor.a': { 'thresholds': [ { 'below': 10, 'class': 'alarm' } ] } })
+    dom_manipulations.create_views()
+    dom_manipulations.show_page('view-1')
+    dom_render.schedule('sensor.a', 5)
+    dom_render.flush()
+    value_e = dom.querySelector('.entity-value')
+    assert value_e.className == 'entity-value alarm'
+    configure({ 'sensor.a': {} })
+    dom_manipulations.create_views()
+    dom_render.flush()
+    assert value_e.className == 'entity-value'
+    assert value_e.innerText == '5'
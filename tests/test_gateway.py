@@ -0,0 +1,72 @@
+import asyncio
+import inspect
+import json
+
+import pytest
+
+import codec
+import dom_render
+import gateway
+
+
+@pytest.fixture
+def gw(dom):
+    gw = gateway._Gateway('ws://test')
+    gw._configured = True
+    return gw
+
+
+def _dispatch(gw, msg):
+    asyncio.run(gw._dispatch(json.dumps(msg)))
+
+
+@pytest.mark.parametrize('tag', sorted(t for t, h in gateway._HANDLERS.items() if h.args))
+def test_positional_args_match_signature(tag):
+    h = gateway._HANDLERS[tag]
+    params = list(inspect.signature(h.fn).parameters)[1:]
+    assert tuple(params[:len(h.args)]) == h.args
+
+
+def test_state_update(gw):
+    _dispatch(gw, { 'tag': 'state_update', 'eid': 'sensor.a', 'value': 1.0, 'version': 7 })
+    assert dom_render.latest()['sensor.a'] == 1.0
+    assert gw._state_version == 7
+
+
+def test_state_update_batch(gw):
+    _dispatch(gw, { 'tag': 'state_update_batch', 'updates': [ [ 'sensor.a', 2 ], [ 'sensor.b', 3 ] ], 'version': 9 })
+    assert dom_render.latest()['sensor.a'] == 2
+    assert dom_render.latest()['sensor.b'] == 3
+    assert gw._state_version == 9
+
+
+def test_keyword_handler(gw):
+    _dispatch(gw, { 'tag': 'codec', 'name': 'msgpack' })
+    assert isinstance(gw._codec, codec.PackCodec)
+
+
+def test_unknown_tag_ignored(gw):
+    _dispatch(gw, { 'tag': 'no such tag' })
+    assert gw._state_version is None
+
+
+def test_bad_cache_cleared(gw, monkeypatch):
+    import storage
+
+    def bad_config(value, views=None):
+        raise ValueError("bad config")
+    monkeypatch.setattr(gw, '_apply_config', bad_config)
+    # connecting fails at once: no server
+    monkeypatch.setattr(gw, '_urls', [ 'ws://127.0.0.1:1' ])
+    storage.save('config', { 'app': {} })
+    storage.save('state', { 'version': 3, 'values': {} })
+
+    async def run():
+        task = asyncio.ensure_future(gw.run())
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+    asyncio.run(run())
+    assert storage.load('config') is None
+    assert storage.load('state') is None
+    assert gw._state_version is None
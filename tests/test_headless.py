@@ -0,0 +1,60 @@
+import pytest
+
+import headless
+from utilities import config, ids
+
+
+def test_inner_html_round_trip():
+    e = headless.document.createElement('div')
+    html = '<div id="a" class="x y"><span>1 &lt; 2</span><input value="v" disabled></div>'
+    e.innerHTML = html
+    assert e.innerHTML == html
+    assert e.querySelector('span').innerText == '1 < 2'
+
+
+def test_template_content():
+    t = headless.document.createElement('template')
+    t.innerHTML = '<p class="a">x</p><p class="b">y</p>'
+    assert t.children == []
+    assert [ p.className for p in t.content.children ] == [ 'a', 'b' ]
+    assert t.innerHTML == '<p class="a">x</p><p class="b">y</p>'
+
+
+def test_selectors(dom):
+    root = dom.createElement('div')
+    root.innerHTML = '<a class="link view-link"></a><a class="link" id="menu"></a><b class="link"></b>'
+    assert [ e.id for e in root.querySelectorAll('a.link:not(.view-link)') ] == [ 'menu' ]
+    assert root.querySelector('#menu').tagName == 'A'
+    assert len(root.getElementsByClassName('link')) == 3
+
+
+def test_append_fragment_moves_children(dom):
+    t = dom.createElement('template')
+    t.innerHTML = '<i></i><i></i>'
+    parent = dom.createElement('div')
+    parent.appendChild(t.content)
+    assert len(parent.children) == 2
+    assert t.content.children == []
+    assert all(c.parentNode is parent for c in parent.children)
+
+
+def test_index_html_loaded(dom):
+    assert dom.getElementById('messages-list') is not None
+
+
+def test_proxy_destroyed():
+    proxy = headless.create_proxy(lambda x: x + 1)
+    assert proxy(1) == 2
+    proxy.destroy()
+    with pytest.raises(RuntimeError):
+        proxy(1)
+
+
+def test_utilities_stand_in():
+    config.set({ 'app': { 'ping-interval': 3 }, 'entities': { 'sensor.a': { 'name': 'A' } } })
+    assert config.get('app', 'ping-interval') == 3
+    assert config.get('app', 'missing') is None
+    assert config.get_entity_config('sensor.a') == { 'name': 'A' }
+    assert config.get_entity_config('sensor.b') == {}
+    assert config.get_views() == []
+    assert ids.css('sensor.a b') == 'sensor-a-b'
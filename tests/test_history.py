@@ -0,0 +1,55 @@
+import pytest
+
+import history
+
+
+def test_bounded_and_downsampled():
+    h = history.History(16)
+    for i in range(100):
+        h.add(float(i), float(i))
+    assert len(h) <= 16
+    assert h.values[-1] == 99
+    # older points are averaged, recent ones kept
+    assert list(h.times) == sorted(h.times)
+    assert h.version == 100
+
+
+@pytest.mark.parametrize('size', [ 16, 18, 22, 30, 37 ])
+def test_downsample_keeps_times_unique(size):
+    h = history.History(size)
+    for i in range(size * 3):
+        h.add(float(i), float(i))
+    assert len(set(h.times)) == len(h.times)
+    assert len(h.values) == len(h.times) <= size
+
+
+def test_polyline():
+    h = history.History(16)
+    assert h.polyline() == ""
+    h.add(0, 0)
+    h.add(10, 1)
+    assert h.polyline(100, 20) == "0.0,20.0 100.0,0.0"
+
+
+def test_configure_keeps_data(dom, configure):
+    configure({ 'sensor.a': { 'history': True }, 'sensor.b': {} })
+    history.configure()
+    assert history.get('sensor.b') is None
+    history.record('sensor.a', 1)
+    history.record('sensor.a', 'not a number')
+    history.record('sensor.b', 1)
+    assert len(history.get('sensor.a')) == 1
+    configure({ 'sensor.a': { 'history': 32 } })
+    history.configure()
+    assert len(history.get('sensor.a')) == 1
+    assert history.get('sensor.a').size == 32
+    configure({ 'sensor.a': {} })
+    history.configure()
+    assert history.get('sensor.a') is None
+
+
+def test_budget(dom, configure):
+    configure({ f"sensor.e{i}": { 'history': 1000 } for i in range(100) })
+    history.configure()
+    total = sum(history.get(f"sensor.e{i}").size for i in range(100)) * 8
+    assert total <= history._BUDGET
@@ -0,0 +1,96 @@
+import pytest
+
+from keepalive import Keepalive
+
+
+def test_timeout_before_measurements(clock):
+    k = Keepalive(interval=4)
+    assert k.timeout == 2
+
+
+def test_rto_from_rtt(clock):
+    k = Keepalive(interval=5, min_timeout=0.01)
+    for rtt in (0.1, 0.1, 0.1):
+        ts = k.ping()
+        clock[0] += rtt
+        assert k.pong(ts) == pytest.approx(rtt)
+    # RFC 6298: srtt 0.1, rttvar 0.05 * 0.75 * 0.75
+    assert k.timeout == pytest.approx(0.1 + 4 * 0.05 * 0.75 ** 2)
+
+
+def test_rto_clamped(clock):
+    k = Keepalive(interval=5, min_timeout=0.5)
+    ts = k.ping()
+    clock[0] += 0.001
+    k.pong(ts)
+    assert k.timeout == 0.5
+    ts = k.ping()
+    clock[0] += 20
+    k.pong(ts)
+    assert k.timeout == 5
+
+
+def test_foreign_pong_ignored(clock):
+    k = Keepalive(interval=5)
+    assert k.pong(clock[0] + 1) is None
+    assert k.pong(clock[0] - 100) is None
+    assert k.pong() is None
+
+
+def _pings(k, clock, seconds, data=True, rtt=0.01, step=0.1):
+    """Pings sent in seconds, data: something arrives every step."""
+    pings = 0
+    pending = None
+    for _ in range(round(seconds / step)):
+        clock[0] += step
+        if pending is not None and clock[0] >= pending + rtt:
+            k.received()
+            k.pong(pending)
+            pending = None
+        elif data:
+            k.received()
+        if k.ping_due() <= 0:
+            pings += 1
+            pending = k.ping()
+            k.sent()
+    return pings
+
+
+@pytest.mark.parametrize('data', [ True, False ])
+def test_pings_per_minute(clock, data):
+    k = Keepalive(interval=5)
+    # the baseline pinged every 5 s: 12 per minute
+    assert _pings(k, clock, 60, data) <= 6
+
+
+def test_max_silence_configurable(clock):
+    k = Keepalive(interval=5)
+    k.max_silence = 5
+    assert 11 <= _pings(k, clock, 60) <= 12
+    k.max_silence = None
+    assert k.max_silence == 10
+
+
+def test_probe_when_data_stops(clock):
+    k = Keepalive(interval=4, max_silence=100)
+    _pings(k, clock, 10)
+    assert _pings(k, clock, k.probe_after + 0.05, data=False) == 1
+
+
+def test_dead(clock):
+    k = Keepalive(interval=4, min_timeout=0.5)
+    clock[0] += k.probe_after
+    k.ping()
+    clock[0] += k.timeout / 2
+    assert not k.dead()
+    clock[0] += k.timeout
+    assert k.dead()
+    k.received()
+    assert not k.dead()
+
+
+def test_idle_not_dead(clock):
+    k = Keepalive(interval=5)
+    _pings(k, clock, 60, data=False)
+    assert not k.dead()
+    assert k.recv_timeout() > 0
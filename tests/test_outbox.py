@@ -0,0 +1,72 @@
+from outbox import Outbox
+
+
+def test_order_kept():
+    o = Outbox()
+    for i in range(3):
+        o.put({ 'tag': 'config_put', 'n': i })
+    assert [ m['n'] for m in o.drain() ] == [ 0, 1, 2 ]
+    assert len(o) == 0
+
+
+def test_coalesce_keeps_latest_at_the_end():
+    o = Outbox()
+    o.put({ 'tag': 'state_get_all', 'since': 1 })
+    o.put({ 'tag': 'config_put', 'n': 0 })
+    o.put({ 'tag': 'state_get_all', 'since': 2 })
+    assert o.drain() == [ { 'tag': 'config_put', 'n': 0 }, { 'tag': 'state_get_all', 'since': 2 } ]
+
+
+def test_transient_not_queued():
+    o = Outbox()
+    for tag in ('ping', 'pong', 'codec_offer', 'session_resume'):
+        o.put({ 'tag': tag })
+    assert len(o) == 0
+
+
+def test_bounded():
+    o = Outbox(size=2)
+    for i in range(5):
+        o.put({ 'tag': 'config_put', 'n': i })
+    assert [ m['n'] for m in o.drain() ] == [ 3, 4 ]
+    assert o.dropped == 3
+
+
+def _chunks(n, config=0):
+    return [ { 'tag': 'config_chunk', 'seq': i, 'count': n, 'data': f"{config}.{i}" } for i in range(n) ]
+
+
+def test_chunk_set_dropped_whole():
+    o = Outbox(size=4)
+    for msg in _chunks(3):
+        o.put(msg)
+    o.put({ 'tag': 'config_put', 'n': 0 })
+    o.put({ 'tag': 'config_put', 'n': 1 })
+    assert o.drain() == [ { 'tag': 'config_put', 'n': 0 }, { 'tag': 'config_put', 'n': 1 } ]
+    assert o.dropped == 3
+
+
+def test_chunk_set_larger_than_queue():
+    o = Outbox(size=2)
+    o.put({ 'tag': 'config_put', 'n': 0 })
+    for msg in _chunks(4):
+        o.put(msg)
+    assert all(m['tag'] != 'config_chunk' for m in o.drain())
+
+
+def test_new_chunk_set_replaces_queued():
+    o = Outbox()
+    for msg in _chunks(3, 'old') + _chunks(2, 'new'):
+        o.put(msg)
+    assert [ m['data'] for m in o.drain() ] == [ 'new.0', 'new.1' ]
+    assert o.dropped == 0
+
+
+def test_drops_counted():
+    import metrics
+    dropped = metrics.counter("outbox dropped")
+    before = dropped.count
+    o = Outbox(size=1)
+    o.put({ 'tag': 'config_put' })
+    o.put({ 'tag': 'config_put' })
+    assert dropped.count == before + 1
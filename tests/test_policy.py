@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import dom_render
+import policy
+
+
+@pytest.fixture
+def shown(monkeypatch):
+    """Values passed on to dom_render, (eid, value) in order."""
+    values = []
+    monkeypatch.setattr(dom_render, 'schedule', lambda eid, value: values.append((eid, value)))
+    yield values
+    for p in policy._POLICIES.values():
+        p.cancel()
+    policy._POLICIES.clear()
+
+
+def test_no_policy_passes_through(shown, configure):
+    configure({ 'sensor.a': {} })
+    policy.configure()
+    policy.schedule('sensor.a', 1)
+    policy.schedule('sensor.a', 2)
+    assert shown == [ ('sensor.a', 1), ('sensor.a', 2) ]
+
+
+def test_deadband(shown, configure):
+    configure({ 'sensor.a': { 'deadband': 0.5 } })
+    policy.configure()
+    for v in (10, 10.2, 10.4, 11, 10.7):
+        policy.schedule('sensor.a', v)
+    assert [ v for _, v in shown ] == [ 10, 11 ]
+
+
+def test_max_rate_shows_last_of_burst(shown, configure):
+    async def run():
+        configure({ 'sensor.a': { 'max-rate': 20 } })
+        policy.configure()
+        for v in range(5):
+            policy.schedule('sensor.a', v)
+        assert [ v for _, v in shown ] == [ 0 ]
+        await asyncio.sleep(0.1)
+        assert [ v for _, v in shown ] == [ 0, 4 ]
+    asyncio.run(run())
+
+
+def test_window_first_value_at_once(shown, configure):
+    async def run():
+        configure({ 'sensor.a': { 'window': 0.05, 'aggregate': 'max' } })
+        policy.configure()
+        for v in (1, 5, 3):
+            policy.schedule('sensor.a', v)
+        assert [ v for _, v in shown ] == [ 1 ]
+        await asyncio.sleep(0.1)
+        assert [ v for _, v in shown ] == [ 1, 5 ]
+        policy.resync()
+        policy.schedule('sensor.a', 2)
+        assert [ v for _, v in shown ] == [ 1, 5, 2 ]
+    asyncio.run(run())
+
+
+def test_configure_keeps_unchanged(shown, configure):
+    async def run():
+        configure({ 'sensor.a': { 'window': 0.05 }, 'sensor.b': { 'max-rate': 1 } })
+        policy.configure()
+        for v in (1, 2, 4):
+            policy.schedule('sensor.a', v)
+        a = policy._POLICIES['sensor.a']
+        configure({ 'sensor.a': { 'window': 0.05 }, 'sensor.b': { 'max-rate': 2 } })
+        policy.configure()
+        assert policy._POLICIES['sensor.a'] is a
+        await asyncio.sleep(0.1)
+        assert shown == [ ('sensor.a', 1), ('sensor.a', 3) ]
+        configure({ 'sensor.b': { 'max-rate': 2 } })
+        policy.configure()
+        assert 'sensor.a' not in policy._POLICIES
+    asyncio.run(run())
+
+
+def test_wire(shown, configure):
+    entities = { 'sensor.a': { 'max-rate': 2, 'name': 'A' } }
+    configure(entities)
+    policy.configure()
+    assert policy.wire() is None
+    configure(entities, app={ 'gateway-rate-policy': True })
+    assert policy.wire() == { 'sensor.a': { 'max-rate': 2 } }
@@ -0,0 +1,44 @@
+import pytest
+
+import metrics
+import proxies
+
+
+def _live():
+    return metrics.gauge("js proxies").value
+
+
+def test_live_count():
+    before = _live()
+    owner = proxies.Proxies()
+    handlers = [ owner.create(lambda event=None: i) for i in range(3) ]
+    assert len(owner) == 3
+    assert _live() == before + 3
+    owner.destroy()
+    assert len(owner) == 0
+    assert _live() == before
+    with pytest.raises(RuntimeError):
+        handlers[0]()
+
+
+def test_destroy_twice():
+    before = _live()
+    owner = proxies.Proxies()
+    owner.create(print)
+    owner.destroy()
+    owner.destroy()
+    assert _live() == before
+
+
+def test_views_own_their_handlers(dom):
+    from utilities import config
+    import dom_manipulations
+    before = _live()
+    config.set({ 'views': [ { 'icon': 'a', 'entities': [] }, { 'icon': 'b', 'entities': [] } ] })
+    dom_manipulations.create_views()
+    assert _live() == before + 2
+    config.set({ 'views': [ { 'icon': 'a', 'entities': [] } ] })
+    dom_manipulations.create_views()
+    assert _live() == before + 1
+    dom_manipulations.reset()
+    assert _live() == before
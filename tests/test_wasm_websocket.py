@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from wasm_websocket import _RingBuffer, _is_state, DROP_OLDEST, DROP_NEWEST
+
+
+STATE = '{"tag": "state_update", "eid": "a", "value": 1}'
+
+
+def _fill(buffer, items):
+    for item in items:
+        buffer.put(item)
+    return list(buffer._items)
+
+
+def test_drop_oldest():
+    b = _RingBuffer(3, DROP_OLDEST)
+    assert _fill(b, range(5)) == [ 2, 3, 4 ]
+    assert b.dropped == 2
+
+
+def test_drop_newest():
+    b = _RingBuffer(3, DROP_NEWEST)
+    assert _fill(b, range(5)) == [ 0, 1, 2 ]
+    assert b.dropped == 2
+
+
+def test_drop_oldest_state_update_only():
+    b = _RingBuffer(2, DROP_OLDEST, _is_state)
+    items = _fill(b, [ '{"tag": "pong"}', STATE, '{"tag": "config_put"}', STATE + ' ' ])
+    assert items == [ '{"tag": "pong"}', '{"tag": "config_put"}', STATE + ' ' ]
+    assert b.dropped == 1
+
+
+def test_drop_newest_state_update_only():
+    b = _RingBuffer(1, DROP_NEWEST, _is_state)
+    assert _fill(b, [ STATE, STATE, '{"tag": "pong"}' ]) == [ STATE, '{"tag": "pong"}' ]
+    assert b.dropped == 1
+
+
+def test_is_state():
+    assert _is_state(STATE)
+    assert _is_state(b'\x83\xa3tag\xacstate_update')
+    assert not _is_state('{"tag": "pong"}')
+    assert not _is_state(b'\x81\xa3tag\xa4pong')
+
+
+def test_get_many():
+    async def run():
+        b = _RingBuffer(10)
+        _fill(b, [ 1, 2 ])
+        assert await b.get_many() == [ 1, 2 ]
+        with pytest.raises(asyncio.TimeoutError):
+            await b.get_many(timeout=0.01)
+        asyncio.get_event_loop().call_later(0.01, b.put, 3)
+        assert await b.get(timeout=1) == 3
+    asyncio.run(run())
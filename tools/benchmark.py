@@ -0,0 +1,404 @@
+"""Benchmarks of the webapp's message processing, run natively.
+
+    python tools/benchmark.py [-k PATTERN] [--json FILE] [--compare FILE]
+                              [--min-time SECONDS] [--rounds N]
+
+Runs the app modules under CPython on the headless DOM (app/python/dom.py,
+headless.py): frame decoding, handler dispatch, value formatting, DOM
+flushes, view construction for 10/100/1000 entities and the resync after a
+reconnect (state snapshot). Each benchmark is calibrated to run for about
+--min-time per round, and timed for --rounds rounds; per operation times
+are reported (min, median, mean, stdev).
+
+--json writes the results, together with the git commit and Python version;
+--compare shows the change relative to such a file, e.g. from the previous
+commit. CPython numbers are not Pyodide numbers, but the ratios between
+commits are what shows regressions.
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'python'))
+
+import storage
+# never touch the cache of a real installation
+storage._DIR = tempfile.mkdtemp(prefix='rv-benchmark-')
+
+import headless
+import codec
+import dom_render
+import dom_manipulations
+import gateway
+import history
+import formats
+from utilities import config
+
+
+_BENCHMARKS = []    # (name, setup), setup() -> fn(), sync or async
+
+
+def benchmark(name):
+    def register(setup):
+        _BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+# fixtures
+
+def make_config(entities, views=1):
+    eids = [ f"sensor.bench_{i}" for i in range(entities) ]
+    per_view = -(-entities // views) if entities else 0
+    return {
+        'app': { 'release': True, 'ping-interval': 5 },
+        'views': [
+            { 'icon': 'speed', 'entities': eids[i*per_view:(i+1)*per_view] }
+            for i in range(views)
+        ],
+        'entities': { eid: { 'name': f"Bench {i}", 'icon': 'speed' } for i, eid in enumerate(eids) },
+    }
+
+
+def reset_dom():
+    """Fresh document, no views and no histories."""
+    headless.load()
+    history.reset()
+    dom_manipulations.reset()
+
+
+def setup_views(entities, views=1):
+    """Configured app showing view-1, returns its eids."""
+    reset_dom()
+    cfg = make_config(entities, views)
+    config.set(cfg)
+    dom_manipulations.create_views()
+    dom_manipulations.show_page('view-1')
+    return cfg['views'][0]['entities']
+
+
+def state_updates(eids, n=1000):
+    return [
+        { 'tag': 'state_update', 'eid': eids[i % len(eids)], 'value': i * 0.1, 'version': i }
+        for i in range(n)
+    ]
+
+
+def make_gateway():
+    gw = gateway._Gateway('ws://benchmark')
+    gw._configured = True
+    return gw
+
+
+# decoding
+
+_STATE_UPDATE = { 'tag': 'state_update', 'eid': 'sensor.bench_1', 'value': 12.5, 'version': 1 }
+
+
+@benchmark('decode json state_update')
+def _():
+    data = json.dumps(_STATE_UPDATE)
+    decode, c = codec.decode, codec.JsonCodec()
+    return lambda: decode(data, c)
+
+
+def _pack(enc, msg):
+    # as sent by the gateway: no envelope
+    buf = bytearray()
+    enc._pack(msg, buf)
+    return bytes(buf)
+
+
+@benchmark('decode msgpack state_update')
+def _():
+    enc, dec = codec.PackCodec(), codec.PackCodec()
+    # first frame defines the interned strings, later ones refer to them
+    codec.decode(_pack(enc, _STATE_UPDATE), dec)
+    data = _pack(enc, _STATE_UPDATE)
+    decode = codec.decode
+    return lambda: decode(data, dec)
+
+
+@benchmark('decode msgpack state_update_batch 100')
+def _():
+    enc, dec = codec.PackCodec(), codec.PackCodec()
+    batch = { 'tag': 'state_update_batch', 'updates': [ [ f"sensor.bench_{i}", i * 0.5 ] for i in range(100) ], 'version': 1 }
+    codec.decode(_pack(enc, batch), dec)
+    data = _pack(enc, batch)
+    decode = codec.decode
+    return lambda: decode(data, dec)
+
+
+# dispatch: decode, handler lookup, handler, schedule
+
+@benchmark('dispatch state_update')
+def _():
+    eids = setup_views(100)
+    gw = make_gateway()
+    frames = [ json.dumps(m) for m in state_updates(eids, 100) ]
+    dispatch = gw._dispatch
+    async def run():
+        for frame in frames:
+            await dispatch(frame)
+        dom_render.flush()
+    run.ops = len(frames)
+    return run
+
+
+@benchmark('dispatch state_update_batch 100')
+def _():
+    eids = setup_views(100)
+    gw = make_gateway()
+    frame = json.dumps({ 'tag': 'state_update_batch', 'updates': [ [ eid, 1.5 ] for eid in eids ], 'version': 1 })
+    dispatch = gw._dispatch
+    async def run():
+        await dispatch(frame)
+        dom_render.flush()
+    return run
+
+
+# formatting and DOM writes
+
+_VALUES = [ 12.345, 7, 'on', None, -0.05 ] * 20
+
+
+@benchmark('format default')
+def _():
+    format_value = formats.default
+    def run():
+        for v in _VALUES:
+            format_value(v)
+    run.ops = len(_VALUES)
+    return run
+
+
+@benchmark('format unit, precision, thresholds')
+def _():
+    format_value = formats.make_formatter({
+        'unit': 'V', 'precision': 2,
+        'thresholds': [ { 'below': 0, 'class': 'low' }, { 'above': 10, 'class': 'high' } ],
+    })
+    def run():
+        for v in _VALUES:
+            format_value(v)
+    run.ops = len(_VALUES)
+    return run
+
+
+@benchmark('flush 100 changed values')
+def _():
+    eids = setup_views(100)
+    schedule, flush = dom_render.schedule, dom_render.flush
+    value = [ 0 ]
+    def run():
+        value[0] += 1
+        for eid in eids:
+            schedule(eid, value[0])
+        flush()
+    return run
+
+
+@benchmark('flush 100 unchanged values')
+def _():
+    eids = setup_views(100)
+    schedule, flush = dom_render.schedule, dom_render.flush
+    def run():
+        for eid in eids:
+            schedule(eid, 1)
+        flush()
+    return run
+
+
+# history and sparklines
+
+@benchmark('history record')
+def _():
+    h = history.History(120)
+    value = [ 0.0 ]
+    def run():
+        value[0] += 0.5
+        h.add(value[0], value[0])
+    return run
+
+
+@benchmark('draw 12 sparklines')
+def _():
+    cfg = make_config(12)
+    for entity in cfg['entities'].values():
+        entity['history'] = True
+    reset_dom()
+    config.set(cfg)
+    history.configure()
+    dom_manipulations.create_views()
+    dom_manipulations.show_page('view-1')
+    eids = cfg['views'][0]['entities']
+    for i in range(120):
+        for eid in eids:
+            history.record(eid, i % 7)
+    record, schedule, flush = history.record, dom_render.schedule, dom_render.flush
+    def run():
+        for eid in eids:
+            record(eid, 1.5)
+            schedule(eid, 1.5)
+        flush()
+    return run
+
+
+# view construction
+
+def _create_views(entities):
+    cfg = make_config(entities)
+    def run():
+        reset_dom()
+        config.set(cfg)
+        dom_manipulations.create_views()
+        dom_manipulations.show_page('view-1')
+    return run
+
+for _n in (10, 100, 1000):
+    benchmark(f'create_views {_n} entities')(lambda n=_n: _create_views(n))
+
+
+def _update_views(entities):
+    setup_views(entities)
+    a, b = make_config(entities), make_config(entities)
+    # one entity renamed: incremental update
+    b['entities']['sensor.bench_0']['name'] = 'Renamed'
+    cfgs = [ a, b ]
+    def run():
+        cfgs.reverse()
+        config.set(cfgs[0])
+        dom_manipulations.create_views()
+    return run
+
+for _n in (10, 100, 1000):
+    benchmark(f'update_views {_n} entities')(lambda n=_n: _update_views(n))
+
+
+# reconnect: resync from a state snapshot
+
+def _resync(entities):
+    eids = setup_views(entities)
+    gw = make_gateway()
+    frames = [
+        json.dumps({ 'tag': 'state_update_batch', 'updates': [ [ eid, v ] for eid in eids ], 'version': v })
+        for v in (1.5, 2.5)
+    ]
+    dispatch = gw._dispatch
+    async def run():
+        frames.reverse()
+        await gw._state_get_all(delta=True)
+        await dispatch(frames[0])
+        dom_render.flush()
+    return run
+
+for _n in (10, 100, 1000):
+    benchmark(f'resync {_n} entities')(lambda n=_n: _resync(n))
+
+
+# runner
+
+async def _call(fn, n):
+    is_async = asyncio.iscoroutinefunction(fn)
+    t = time.perf_counter()
+    if is_async:
+        for _ in range(n):
+            await fn()
+    else:
+        for _ in range(n):
+            fn()
+    return time.perf_counter() - t
+
+
+async def measure(fn, min_time, rounds):
+    """Seconds per operation for each round."""
+    n = 1
+    while True:
+        t = await _call(fn, n)
+        if t >= min_time / 10:
+            break
+        n *= 10
+    n = max(1, int(n * min_time / t))
+    ops = getattr(fn, 'ops', 1)
+    return [ await _call(fn, n) / (n * ops) for _ in range(rounds) ]
+
+
+def stats(samples):
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': len(samples),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run([ 'git', 'rev-parse', '--short', 'HEAD' ], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _us(t):
+    return f"{t*1e6:10.2f}"
+
+
+async def run(args):
+    results = {}
+    for name, setup in _BENCHMARKS:
+        if args.k and not fnmatch.fnmatch(name, f"*{args.k}*"):
+            continue
+        fn = setup()
+        results[name] = stats(await measure(fn, args.min_time, args.rounds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', help="only benchmarks with names containing this")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="results file to compare with")
+    parser.add_argument('--min-time', type=float, default=0.1, help="seconds per round")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    results = asyncio.run(run(args))
+
+    base = {}
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['benchmarks']
+    print(f"{'benchmark':36s} {'min us':>10s} {'median us':>10s} {'stdev us':>10s}" + ("  change" if base else ""))
+    for name, s in results.items():
+        line = f"{name:36s} {_us(s['min'])} {_us(s['median'])} {_us(s['stdev'])}"
+        if name in base:
+            line += f"  {s['median'] / base[name]['median'] - 1:+7.1%}"
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'benchmarks': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Build a deployable copy of the webapp with the Python code bundled.
+
+    python tools/bundle.py [--dist DIR] [--force]
+
+Copies app/ to DIR (default dist/) and replaces the python/ sources with a
+single zip of precompiled .pyc files (app.zip): one fetch instead of one per
+module, and no compilation in the browser. The modules are imported from the
+zip with zipimport.
+
+.pyc files are specific to the Python version. Run this with the same minor
+version as the Pyodide release in py-config.toml (see _PYODIDE_PYTHON), or
+pass --force to build anyway.
+"""
+
+import argparse
+import os
+import py_compile
+import re
+import shutil
+import sys
+import tempfile
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'app')
+BUNDLE = 'app.zip'
+
+# Pyodide release -> Python version it ships
+_PYODIDE_PYTHON = {
+    '0.21': (3, 10),
+    '0.22': (3, 10),
+    '0.23': (3, 11),
+    '0.24': (3, 11),
+}
+
+
+def pyodide_python(py_config):
+    m = re.search(r'pyodide/v(\d+\.\d+)', py_config)
+    return _PYODIDE_PYTHON.get(m.group(1)) if m else None
+
+
+def build_zip(src, dst):
+    """Compile all modules in src into a zip of .pyc files."""
+    with tempfile.TemporaryDirectory() as tmp, \
+            zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED) as z:
+        for dirpath, dirnames, filenames in os.walk(src):
+            dirnames[:] = [ d for d in dirnames if d != '__pycache__' ]
+            for name in sorted(filenames):
+                if not name.endswith('.py'):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), src)
+                pyc = os.path.join(tmp, rel + 'c')
+                os.makedirs(os.path.dirname(pyc), exist_ok=True)
+                # no source in the bundle, nothing to check the pyc against
+                py_compile.compile(
+                    os.path.join(dirpath, name), cfile=pyc, dfile=rel, doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                z.write(pyc, rel + 'c')
+                print(f"  {rel}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dist', default=os.path.join(ROOT, 'dist'))
+    parser.add_argument('--force', action='store_true', help="ignore Python version mismatch")
+    args = parser.parse_args()
+
+    with open(os.path.join(APP, 'py-config.toml')) as f:
+        py_config = f.read()
+    version = pyodide_python(py_config)
+    if version != sys.version_info[:2] and not args.force:
+        sys.exit(f"Pyodide uses Python {version}, this is {sys.version_info[:2]}: .pyc files would not load (--force to build anyway)")
+
+    shutil.rmtree(args.dist, ignore_errors=True)
+    shutil.copytree(APP, args.dist, ignore=shutil.ignore_patterns('python', '__pycache__'))
+    print(f"{BUNDLE}:")
+    build_zip(os.path.join(APP, 'python'), os.path.join(args.dist, BUNDLE))
+
+    # fetch the bundle instead of the sources
+    py_config = re.sub(r'\[\[fetch\]\]\s*files\s*=\s*\[.*?\]', f'[[fetch]]\nfiles = [ "{BUNDLE}" ]', py_config, flags=re.S)
+    with open(os.path.join(args.dist, 'py-config.toml'), 'w') as f:
+        f.write(py_config)
+
+    index = os.path.join(args.dist, 'index.html')
+    with open(index) as f:
+        html = f.read()
+    html = html.replace("sys.path.append('python')", f"sys.path.insert(0, '{BUNDLE}')")
+    with open(index, 'w') as f:
+        f.write(html)
+
+    worker = os.path.join(args.dist, 'worker.js')
+    with open(worker) as f:
+        js = f.read()
+    js = js.replace("const BUNDLE = null;", f'const BUNDLE = "{BUNDLE}";')
+    with open(worker, 'w') as f:
+        f.write(js)
+    print(f"built {args.dist}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Load test: N headless webapp clients against one gateway.
+
+    python tools/loadtest.py [--clients N] [--entities M] [--rate R] [--duration S]
+                             [--url ws://gateway/ws] [--json FILE]
+
+Without --url a stand-in gateway is started locally. It speaks the gateway
+protocol (config, state snapshots, pings, codec selection) and streams
+state_update messages for M entities at R updates per second, to every client.
+With --clients 0 only the stand-in gateway runs (e.g. to point a browser
+at it). With --url the clients connect to a real gateway (e.g. an ESP32)
+and only receive what it sends.
+
+Each client is a separate process running the real gateway client
+(app/python/gateway.py) on the headless DOM (app/python/headless.py), so
+the numbers include decoding, dispatch and rendering. Reports per client
+messages received, receive rate and ping round trip times (pings are sent
+every max-silence seconds, twice the ping-interval by default, see
+keepalive.py), and totals.
+Needs the websockets package; no browser.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYTHON = os.path.join(ROOT, 'app', 'python')
+
+
+# stand-in gateway
+
+def make_config(entities, views=4):
+    """Configuration with entities spread over views."""
+    eids = [ f"sensor.load_{i}" for i in range(entities) ]
+    per_view = -(-entities // views) if entities else 0
+    return {
+        'app': { 'release': True, 'ping-interval': 5 },
+        'views': [
+            { 'icon': 'speed', 'entities': eids[i*per_view:(i+1)*per_view] }
+            for i in range(views)
+        ],
+        'entities': { eid: { 'name': f"Load {i}", 'icon': 'speed' } for i, eid in enumerate(eids) },
+    }
+
+
+class Gateway:
+    """Minimal gateway: answers the client protocol, broadcasts state updates."""
+
+    def __init__(self, config, rate):
+        self._config = config
+        self._eids = list(config['entities'])
+        self._rate = rate
+        self._values = { eid: 0.0 for eid in self._eids }
+        self._version = 0
+        self._clients = set()
+        self.sent = 0
+
+    async def handle(self, ws, path=None):
+        self._clients.add(ws)
+        try:
+            async for data in ws:
+                msg = json.loads(data).get('data', {})
+                for reply in self._answer(msg):
+                    await ws.send(json.dumps(reply))
+                    self.sent += 1
+        except Exception:
+            pass
+        finally:
+            self._clients.discard(ws)
+
+    def _answer(self, msg):
+        tag = msg.get('tag')
+        if tag == 'ping':
+            reply = { 'tag': 'pong' }
+            if 'ts' in msg:
+                reply['ts'] = msg['ts']
+            yield reply
+        elif tag == 'codec_offer':
+            yield { 'tag': 'codec', 'name': 'json' }
+        elif tag == 'config_get':
+            yield { 'tag': 'config_put', 'value': self._config }
+        elif tag == 'state_get_all':
+            yield { 'tag': 'state_update_batch', 'updates': list(self._values.items()), 'version': self._version }
+
+    async def stream(self):
+        """state_update to all clients, rate per second in total."""
+        if not self._rate or not self._eids:
+            return
+        interval = 1 / self._rate
+        due = time.perf_counter()
+        while True:
+            due += interval
+            await asyncio.sleep(max(0, due - time.perf_counter()))
+            eid = random.choice(self._eids)
+            value = self._values[eid] = round(random.uniform(0, 100), 2)
+            self._version += 1
+            data = json.dumps({ 'tag': 'state_update', 'eid': eid, 'value': value, 'version': self._version })
+            for ws in list(self._clients):
+                try:
+                    await ws.send(data)
+                    self.sent += 1
+                except Exception:
+                    pass
+
+
+# client, runs in its own process
+
+async def _client(url, duration):
+    sys.path.insert(0, PYTHON)
+    import storage
+    # no state shared between clients (or with a real installation)
+    storage._DIR = tempfile.mkdtemp(prefix='rv-loadtest-')
+    # headless DOM, and the utilities stand-in if needed
+    import headless
+    import metrics
+    import gateway
+
+    task = asyncio.ensure_future(gateway.gateway_task(url))
+    await asyncio.sleep(duration)
+    task.cancel()
+    rx = metrics.counter("rx messages")
+    rtt = metrics.histogram("ping rtt")
+    dispatch = gateway.handler_stats()
+    return {
+        'rx': rx.count,
+        'rx_rate': rx.count / duration,
+        'rtt_mean': rtt.mean if rtt.count else None,
+        'rtt_p90': rtt.percentile(90) if rtt.count else None,
+        'pings': rtt.count,
+        'handler_time': sum(t for n, t in dispatch.values()),
+        'phases': metrics.phases(),
+    }
+
+
+def client_main(url, duration):
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(_client(url, duration))
+    print(json.dumps(result))
+
+
+# driver
+
+async def run(args):
+    server = gw = stream = None
+    url = args.url
+    if url is None:
+        import websockets
+        gw = Gateway(make_config(args.entities), args.rate)
+        server = await websockets.serve(gw.handle, '127.0.0.1', args.port)
+        url = f"ws://127.0.0.1:{args.port}/ws"
+        stream = asyncio.ensure_future(gw.stream())
+        print(f"stand-in gateway {url}: {args.entities} entities, {args.rate} updates/s")
+
+    procs = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, __file__, '--client', url, '--duration', str(args.duration),
+            stdout=subprocess.PIPE)
+        for _ in range(args.clients)
+    ]
+    if procs:
+        outputs = await asyncio.gather(*(p.communicate() for p in procs))
+    else:
+        # stand-in gateway only, e.g. for a browser
+        outputs = []
+        await asyncio.sleep(args.duration)
+
+    if server is not None:
+        stream.cancel()
+        server.close()
+        await server.wait_closed()
+
+    clients = []
+    for i, (out, err) in enumerate(outputs):
+        try:
+            clients.append(json.loads(out.decode().strip().splitlines()[-1]))
+        except (ValueError, IndexError):
+            print(f"client {i}: failed (exit {procs[i].returncode})")
+            clients.append(None)
+    return {
+        'url': url,
+        'clients': args.clients,
+        'entities': args.entities if gw else None,
+        'rate': args.rate if gw else None,
+        'duration': args.duration,
+        'gateway_sent': gw.sent if gw else None,
+        'results': clients,
+    }
+
+
+def _ms(t):
+    return "-" if t is None else f"{t*1000:.1f}"
+
+
+def report(summary):
+    ok = [ c for c in summary['results'] if c ]
+    for i, c in enumerate(summary['results']):
+        if c:
+            print(f"client {i:3d}: {c['rx']:8d} rx {c['rx_rate']:8.1f}/s  rtt mean {_ms(c['rtt_mean'])} p90 {_ms(c['rtt_p90'])} ms")
+    if ok:
+        total = sum(c['rx_rate'] for c in ok)
+        worst = max((c['rtt_p90'] for c in ok if c['rtt_p90'] is not None), default=None)
+        print(f"{len(ok)}/{summary['clients']} clients ok, {total:.1f} rx/s in total, worst rtt p90 {_ms(worst)} ms")
+    if summary['rate']:
+        expected = summary['rate'] * summary['duration']
+        print(f"expected about {expected:.0f} state updates per client")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--entities', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=50, help="state updates per second (stand-in gateway)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds")
+    parser.add_argument('--url', help="real gateway, e.g. ws://10.0.0.8/ws")
+    parser.add_argument('--port', type=int, default=8765, help="stand-in gateway port")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--client', metavar='URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        client_main(args.client, args.duration)
+        return
+
+    summary = asyncio.run(run(args))
+    report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.clients and not any(summary['results']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()